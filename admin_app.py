@@ -1,10 +1,34 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 from datetime import datetime, timedelta
 import json
 import firebase_admin
 from firebase_admin import credentials, firestore
 import pytz
+from itertools import chain
+from firestore_meter import CostLog, CostMeter, MeteredClient, tracked
+from config_cache import CUSTOM_PROMPTS, GLOBAL_SETTINGS, bump_versions, get_config, write_config
+from operator_registry import (DEFAULT_OPERATORS, ROLES, load_roster, operator_names, rebuild_index, save_operator,
+                               save_roles, search_roster, seed_operators)
+from config_bulk import commit_configs, configs_frame, diff_configs
+from prompt_registry import (APP_PROMPT_URLS, load_index as load_prompt_index, refresh_registry, refresh_stale,
+                             resolve_prompt)
+from vertex_cache import MIN_CACHE_TOKENS, VERTEX_MODELS, delete_stale, list_caches, warm_caches
+from key_balancer import DEFAULT_DAYS, balance, operator_profiles, project_peaks
+from google.oauth2 import service_account
+from stats_fetch import (ALL_TIME_RANGE, DAY_COLLECTIONS, EW_COLLECTION, STATS_COLLECTION,
+                         backfill_date_field, backfill_diamonds_field, calendar_days, field_masks, first_stats_date,
+                         headline_metrics, iter_operator_days, iter_operator_docs, iter_operator_group,
+                         migrate_session_times)
+from stats_cache import cached_dates, expire_day, iter_operator_days_cached, rebuild_cache
+from stats_agg import add_to_agg, new_stats_agg, summarize
+from stats_delta import DayDeltaTracker
+from stats_live import get_live_day
+from stats_store import StatsStore
+from stats_rollup import (compact_closed_days, dates_after, iter_rollup_docs, load_all_time, recompact_days,
+                          rollup_totals)
 
 # --- 0. KONFIGURACJA ---
 st.set_page_config(page_title="Szturchacz - Admin Hub", layout="wide", page_icon="📊")
@@ -14,7 +38,28 @@ if not firebase_admin._apps:
     creds_dict = json.loads(st.secrets["FIREBASE_CREDS"])
     creds = credentials.Certificate(creds_dict)
     firebase_admin.initialize_app(creds)
-db = firestore.client()
+
+# --- LICZNIK KOSZTU FIRESTORE (odczyty/zapisy/RPC per zakładka i przebieg) ---
+@st.cache_resource
+def get_cost_log():
+    return CostLog()
+
+def get_cost_meter():
+    """Licznik sesji w session_state — ten sam obiekt dla przebiegów skryptu i samych fragmentów
+    (fragment i `db` z przebiegu, który go zdefiniował, liczą do aktualnego licznika)."""
+    if "cost_meter" not in st.session_state:
+        st.session_state.cost_meter = CostMeter(get_cost_log(), cost_day, own_run=fragment_rerun)
+    return st.session_state.cost_meter
+
+def fragment_rerun():
+    """True w przebiegu samego fragmentu (bez reszty skryptu) — liczony jako osobny przebieg."""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+cost_day = datetime.now(pytz.timezone('Europe/Warsaw')).strftime("%Y-%m-%d")
+cost_meter = get_cost_meter()
+cost_meter.new_run(cost_day)
+db = MeteredClient(firestore.client(), cost_meter)
 
 # --- BRAMKA HASŁA ---
 if "password_correct" not in st.session_state:
@@ -37,10 +82,13 @@ if not check_password(): st.stop()
 # ==========================================
 # 🔑 ZAKŁADKI
 # ==========================================
-tab_stats, tab_config, tab_keys = st.tabs(["📊 Statystyki i Diamenty", "⚙️ Konfiguracja Operatorów", "🔑 Stan Kluczy"])
+# on_change="rerun": wykonuje się tylko otwarta zakładka (tab.open), pozostałe nie czytają z bazy
+tab_stats, tab_config, tab_keys = st.tabs(["📊 Statystyki i Diamenty", "⚙️ Konfiguracja Operatorów", "🔑 Stan Kluczy"],
+                                          key="main_tab", on_change="rerun")
 
-# --- LISTA OPERATORÓW ---
-OPERATORS = ["Emilia", "Oliwia", "Iwona", "Marlena", "Magda", "Sylwia", "Ewelina", "Klaudia", "Marta", "EwelinaG", "Andrzej", "Romana", "Kasia"]
+# --- LISTA OPERATORÓW (rejestr w Firestore; indeks z config_cache — jeden odczyt na TTL) ---
+ROSTER = load_roster(db)
+OPERATORS = operator_names(ROSTER)
 
 # --- LISTA PROJEKTÓW GCP (z secrets) ---
 try:
@@ -58,421 +106,955 @@ PROMPT_URLS = {
     # "Prompt Testowy V2": "https://raw.githubusercontent.com/szturchaczysko-cpu/szturchacz/refs/heads/main/prompt_v2.txt",
 }
 
-# ==========================================
-# 📊 ZAKŁADKA 1: STATYSTYKI
-# ==========================================
-with tab_stats:
-    tz_pl = pytz.timezone('Europe/Warsaw')
-    today = datetime.now(tz_pl)
-    
-    col_f1, col_f2, col_f3 = st.columns(3)
-    with col_f1:
-        date_mode = st.radio("Wybór daty:", ["Zakresy", "Kalendarz", "All Time"], horizontal=True)
-    with col_f2:
-        selected_op = st.selectbox("Filtruj operatora:", ["Wszyscy"] + OPERATORS)
-    with col_f3:
-        st.write("")
-        if st.button("🔄 Odśwież dane", type="primary"): st.rerun()
-
-    # --- USTALANIE LISTY DAT ---
-    dates_list = []
-    if date_mode == "Zakresy":
-        r = st.selectbox("Wybierz zakres:", ["Dziś", "Ostatnie 7 dni", "Ostatnie 30 dni"])
-        days = 1 if r == "Dziś" else (7 if r == "Ostatnie 7 dni" else 30)
-        dates_list = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
-    elif date_mode == "Kalendarz":
-        dates_list = [st.date_input("Wybierz dzień:", today).strftime("%Y-%m-%d")]
-    else:
-        with st.spinner("Pobieranie historii dat..."):
-            all_stats_refs = db.collection("stats").list_documents()
-            dates_list = [doc.id for doc in all_stats_refs]
-
-    num_days = len(dates_list) if len(dates_list) > 0 else 1
-
-    # --- POBIERANIE I AGREGACJA ---
-    total_sessions = 0
-    total_diamonds = 0
-    op_summary = {} 
-    all_transitions = {}
-    hourly_sum = {f"{h:02d}": 0 for h in range(24)}
-
-    if dates_list:
-        progress_bar = st.progress(0)
-        for i, d_s in enumerate(dates_list):
-            progress_bar.progress((i + 1) / len(dates_list))
-            docs = db.collection("stats").document(d_s).collection("operators").stream()
-            
-            for doc in docs:
-                name = doc.id
-                if selected_op != "Wszyscy" and name != selected_op: continue
-                
-                data = doc.to_dict()
-                if name not in op_summary: op_summary[name] = {'s': 0, 'd': 0}
-                
-                # 1. Sesje
-                s_count = data.get("sessions_completed", 0)
-                op_summary[name]['s'] += s_count
-                total_sessions += s_count
-                
-                # 2. Rozkład czasu (Godziny)
-                session_times = data.get("session_times", [])
-                for t in session_times:
-                    hour = t.split(":")[0]
-                    if hour in hourly_sum:
-                        hourly_sum[hour] += 1
-                
-                # 3. Przejścia i Diamenty
-                t_map = data.get("pz_transitions", {})
-                if isinstance(t_map, dict):
-                    for k, v in t_map.items():
-                        display_name = k.replace("_to_", " ➡ ")
-                        all_transitions[display_name] = all_transitions.get(display_name, 0) + v
-                        if k.endswith("_to_PZ6"):
-                            op_summary[name]['d'] += v
-                            total_diamonds += v
-        progress_bar.empty()
-
-    # --- WYŚWIETLANIE METRYK ---
+# Dozwolone modele, gdy w global_settings nie ma jeszcze `allowed_models`
+DEFAULT_ALLOWED_MODELS = ["gemini-2.5-pro", "gemini-3-pro-preview"]
+
+def reset_bulk_editor():
+    """Po zapisie konfiguracji: edycja zbiorcza weźmie nową migawkę, niezapisane zmiany w tabeli porzucone."""
+    for key in ("bulk_cfg_snapshot", "bulk_cfg_grid"):
+        st.session_state.pop(key, None)
+
+# --- VERTEX AI (cache kontekstu) ---
+@st.cache_resource
+def get_vertex_credentials():
+    return service_account.Credentials.from_service_account_info(json.loads(st.secrets["FIREBASE_CREDS"]))
+
+# --- FRAGMENTY ---
+def rerun_fragment():
+    """Przelicza tylko bieżący fragment; poza przebiegiem fragmentu (pełny przebieg, AppTest) — całą stronę."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+# --- DANE KONFIGURACJI (krótki cache wspólny dla zakładek i fragmentów, czyszczony po zapisie) ---
+# global_settings i custom_prompts trzyma config_cache (wspólny z aplikacjami operatorów),
+# zapis wyłącznie przez write_config — unieważnia kopię i podbija wersję dokumentu
+CONFIG_TTL_SECONDS = 30
+
+def load_custom_prompt_urls():
+    return get_config(db, CUSTOM_PROMPTS)["urls"]
+
+# Konfiguracje operatorów: jeden get_all dla wszystkich
+@st.cache_data(ttl=CONFIG_TTL_SECONDS, show_spinner=False)
+def load_operator_configs(operators):
+    refs = [db.collection("operator_configs").document(op) for op in operators]
+    return {snap.id: snap.to_dict() or {} for snap in db.get_all(refs)}
+
+# --- WIDOK STATYSTYK ---
+def render_stats_metrics(summary, num_days):
+    total_sessions = summary["total_sessions"]
     st.markdown("---")
     
-    # Pobierz EW stats (casy Wieżowca)
-    ew_total_cases = 0
-    ew_by_operator = {}
-    if dates_list:
-        for d_s in dates_list:
-            ew_docs = db.collection("ew_operator_stats").document(d_s).collection("operators").stream()
-            for doc in ew_docs:
-                name = doc.id
-                if selected_op != "Wszyscy" and name != selected_op: continue
-                d = doc.to_dict()
-                c = d.get("cases_completed", 0)
-                ew_total_cases += c
-                ew_by_operator[name] = ew_by_operator.get(name, 0) + c
-    
     m1, m2, m3, m4 = st.columns(4)
     m1.metric("Suma sesji (okres)", total_sessions)
     m2.metric("Średnia sesji / dzień", round(total_sessions / num_days, 2))
-    m3.metric("Suma Diamentów 💎", total_diamonds)
-    m4.metric("🏢 Casy EW (okres)", ew_total_cases)
+    m3.metric("Suma Diamentów 💎", summary["total_diamonds"])
+    m4.metric("🏢 Casy EW (okres)", summary["ew_total_cases"])
 
-    # --- DIAGNOSTYKA: Porównanie źródeł danych ---
-    with st.expander("🔍 Diagnostyka — surowe dane z bazy", expanded=False):
-        diag_date = dates_list[0] if dates_list else datetime.now(pytz.timezone('Europe/Warsaw')).strftime("%Y-%m-%d")
-        st.caption(f"Data diagnostyki: **{diag_date}**")
-        
-        # 1. stats/{date}/operators/ — źródło dla sesji i diamentów
-        st.markdown("**📊 Kolekcja `stats` (sesje + przejścia PZ):**")
-        stats_docs = list(db.collection("stats").document(diag_date).collection("operators").stream())
-        if stats_docs:
-            for doc in stats_docs:
-                d = doc.to_dict()
-                pz = d.get("pz_transitions", {})
-                st.code(f"{doc.id}: sessions={d.get('sessions_completed', 0)}, pz_transitions={pz}", language=None)
-        else:
-            st.warning(f"⚠️ Brak danych w stats/{diag_date}/operators/")
-        
-        # 2. ew_operator_stats/{date}/operators/ — źródło dla "Zakończone dziś"
-        st.markdown("**🏢 Kolekcja `ew_operator_stats` (casy EW):**")
-        ew_docs = list(db.collection("ew_operator_stats").document(diag_date).collection("operators").stream())
-        if ew_docs:
-            for doc in ew_docs:
-                d = doc.to_dict()
-                st.code(f"{doc.id}: cases_completed={d.get('cases_completed', 0)}", language=None)
-        else:
-            st.warning(f"⚠️ Brak danych w ew_operator_stats/{diag_date}/operators/")
-        
-        # 3. global_stats — łączne diamenty
-        st.markdown("**💎 Kolekcja `global_stats/totals/operators` (łączne diamenty):**")
-        global_docs = list(db.collection("global_stats").document("totals").collection("operators").stream())
-        if global_docs:
-            for doc in global_docs:
-                d = doc.to_dict()
-                st.code(f"{doc.id}: total_diamonds={d.get('total_diamonds', 0)}", language=None)
-        else:
-            st.warning("⚠️ Brak danych w global_stats/totals/operators/")
+def all_time_days(rollup, dates_list, today_str):
+    """Mianownik średnich All Time: dni kalendarzowe od pierwszego dnia z danymi do dziś.
+    Historia z rollupu i dni po watermarku liczone tak samo (jak zakresy 7/30 dni)."""
+    first_day = rollup.get("first_day") if rollup else min(dates_list, default=None)
+    if first_day is None:
+        first_day = first_stats_date(db)
+    return calendar_days(first_day, today_str)
 
+def render_stats_details(summary, num_days, show_hourly=True):
     # --- WYKRES ŚREDNIEJ GODZINOWEJ ---
     st.subheader(f"🕐 Średnia wydajność godzinowa (na podstawie {num_days} dni)")
-    if total_sessions > 0:
-        hourly_avg = {hour: total / num_days for hour, total in hourly_sum.items()}
-        df_hourly = pd.DataFrame(list(hourly_avg.items()), columns=['Godzina', 'Średnia liczba sesji'])
+    if not show_hourly:
+        st.caption("Włącz „🕐 Wykres godzinowy” nad statystykami, żeby pobrać dane godzinowe.")
+    elif summary["total_sessions"] > 0:
+        df_hourly = pd.DataFrame({
+            "Godzina": [f"{h:02d}" for h in range(24)],
+            "Średnia liczba sesji": summary["hourly"] / num_days,
+        })
         st.area_chart(df_hourly.set_index("Godzina"))
     else:
         st.info("Brak danych czasowych dla wybranego okresu.")
 
+    # --- TREND DZIENNY ---
+    per_day = summary["per_day"]
+    if len(per_day) > 1:
+        st.subheader("📅 Trend dzienny")
+        st.line_chart(per_day)
+
     st.markdown("---")
     c_left, c_right = st.columns(2)
 
     with c_left:
         st.subheader("🏆 Ranking Operatorów")
-        if op_summary or ew_by_operator:
-            # Merge EW data into op_summary
-            all_ops = set(list(op_summary.keys()) + list(ew_by_operator.keys()))
-            ranking_data = []
-            for k in all_ops:
-                s = op_summary.get(k, {}).get('s', 0) if k in op_summary else 0
-                d = op_summary.get(k, {}).get('d', 0) if k in op_summary else 0
-                ew = ew_by_operator.get(k, 0)
-                ranking_data.append({
-                    "Operator": k,
-                    "Sesje": s,
-                    "Śr/Dzień": round(s/num_days, 2),
-                    "💎": d,
-                    "🏢 EW": ew,
-                })
-            df_ranking = pd.DataFrame(ranking_data).sort_values(by="🏢 EW", ascending=False)
+        ranking = summary["ranking"]
+        if not ranking.empty:
+            df_ranking = ranking.reset_index()
+            df_ranking.insert(2, "Śr/Dzień", (df_ranking["Sesje"] / num_days).round(2))
+            df_ranking = df_ranking.sort_values(by="🏢 EW", ascending=False)
             st.dataframe(df_ranking, use_container_width=True, hide_index=True)
             st.bar_chart(df_ranking.set_index("Operator")["🏢 EW"])
         else: st.info("Brak danych.")
 
     with c_right:
         st.subheader("📈 Przejścia PZ (Postęp)")
-        if all_transitions:
-            df_tr = pd.DataFrame(list(all_transitions.items()), columns=['Przejście', 'Ilość']).sort_values(by='Ilość', ascending=False)
+        transitions = summary["transitions"]
+        if not transitions.empty:
+            df_tr = transitions.rename("Ilość").reset_index()
             st.dataframe(df_tr, use_container_width=True, hide_index=True)
             st.bar_chart(df_tr.set_index("Przejście")["Ilość"])
         else: st.info("Brak danych.")
 
+# --- WSPÓLNY MAGAZYN STATYSTYK (jeden na proces, dla wszystkich sesji adminów) ---
+@st.cache_resource
+def get_stats_store():
+    return StatsStore()
+
+# --- DIAGNOSTYKA (trzy źródła obok siebie, tylko na żądanie) ---
+DIAG_TTL_SECONDS = 60
+
+@st.cache_data(ttl=DIAG_TTL_SECONDS, show_spinner="Pobieranie danych diagnostycznych...")
+def load_diagnostics(diag_date):
+    stats_docs = {doc.id: doc.to_dict() or {} for doc in
+                  db.collection(STATS_COLLECTION).document(diag_date).collection("operators").stream()}
+    ew_docs = {doc.id: doc.to_dict() or {} for doc in
+               db.collection(EW_COLLECTION).document(diag_date).collection("operators").stream()}
+    global_docs = {doc.id: doc.to_dict() or {} for doc in
+                   db.collection("global_stats").document("totals").collection("operators").stream()}
+
+    rows = []
+    for op in sorted(set(stats_docs) | set(ew_docs) | set(global_docs)):
+        s_d = stats_docs.get(op, {})
+        pz = s_d.get("pz_transitions", {})
+        rows.append({
+            "Operator": op,
+            "Sesje (stats)": s_d.get("sessions_completed", 0),
+            "Przejścia PZ": ", ".join(f"{k}={v}" for k, v in sorted(pz.items())),
+            "💎 dziś (stats)": sum(v for k, v in pz.items() if k.endswith("_to_PZ6")),
+            "🏢 EW (ew_operator_stats)": ew_docs.get(op, {}).get("cases_completed", 0),
+            "💎 łącznie (global_stats)": global_docs.get(op, {}).get("total_diamonds", 0),
+        })
+    missing = [path for path, docs in ((f"stats/{diag_date}/operators/", stats_docs),
+                                       (f"ew_operator_stats/{diag_date}/operators/", ew_docs),
+                                       ("global_stats/totals/operators/", global_docs)) if not docs]
+    return pd.DataFrame(rows), missing
+
+# --- TRYB LIVE (listenery on_snapshot na dzisiejszy dzień) ---
+LIVE_REFRESH_SECONDS = 10
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_live_stats(selected_op):
+    live_day = datetime.now(pytz.timezone('Europe/Warsaw')).strftime("%Y-%m-%d")
+    live = get_live_day(db, live_day)
+    summary, key_usage, last_change = live.view(selected_op)
+    last_change_str = last_change.astimezone(pytz.timezone('Europe/Warsaw')).strftime("%H:%M:%S") if last_change else "-"
+    st.caption(f"🔴 LIVE — {live_day} · ostatnia zmiana: {last_change_str} · "
+               f"odświeżanie co {LIVE_REFRESH_SECONDS}s bez odczytów z bazy")
+    render_stats_metrics(summary, 1)
+    render_stats_details(summary, 1)
+    
+    st.markdown("---")
+    st.subheader("🔑 Zużycie kluczy (dziś)")
+    k_data = [{"Klucz": f"Klucz {i}", "Projekt": p_id, "Zużycie": key_usage.get(str(i), 0)}
+              for i, p_id in enumerate(GCP_PROJECTS, start=1)]
+    if k_data:
+        st.bar_chart(pd.DataFrame(k_data).set_index("Klucz")["Zużycie"])
+    else:
+        st.warning("Brak projektów GCP w konfiguracji.")
+
 # ==========================================
-# ⚙️ ZAKŁADKA 2: KONFIGURACJA
+# 📊 ZAKŁADKA 1: STATYSTYKI
 # ==========================================
-with tab_config:
-    st.title("⚙️ Zarządzanie Systemem")
+# Każda sekcja to osobny fragment: interakcja z jej widżetami przelicza tylko ją
+if tab_stats.open:
+    @st.fragment
+    @tracked(get_cost_meter, lambda: f"📊 Statystyki · {st.session_state.get('stats_date_mode', 'Zakresy')}")
+    def stats_section():
+        tz_pl = pytz.timezone('Europe/Warsaw')
+        today = datetime.now(tz_pl)
+        today_str = today.strftime("%Y-%m-%d")
     
-    global_ref = db.collection("admin_config").document("global_settings")
-    global_cfg = global_ref.get().to_dict() or {"show_diamonds": True}
-    toggle_diamonds = st.toggle("Pokazuj diamenty operatorom w Szturchaczu", value=global_cfg.get("show_diamonds", True))
-    if toggle_diamonds != global_cfg.get("show_diamonds"):
-        global_ref.set({"show_diamonds": toggle_diamonds}, merge=True)
-        st.rerun()
+        col_f1, col_f2, col_f3 = st.columns(3)
+        with col_f1:
+            date_mode = st.radio("Wybór daty:", ["Zakresy", "Kalendarz", "All Time"], horizontal=True, key="stats_date_mode")
+        with col_f2:
+            selected_op = st.selectbox("Filtruj operatora:", ["Wszyscy"] + operator_names(ROSTER, active_only=False),
+                                       key="stats_op")
+        with col_f3:
+            st.write("")
+            refresh_clicked = st.button("🔄 Odśwież dane", type="primary")
+            live_mode = st.toggle("🔴 Live (dziś)", help="Listenery Firestore na dzisiejsze dane — widok odświeża się sam, bez ponownych odczytów.")
+            show_hourly = st.toggle("🕐 Wykres godzinowy", value=True,
+                                    help="Wyłączenie pomija pola godzinowe w odczytach z Firestore (per dzień, "
+                                         "collection group). Wspólny magazyn i cache Parquet i tak je trzymają.")
 
-    st.markdown("---")
+        with st.expander("⚙️ Źródło danych", expanded=False):
+            fetch_engine = st.radio(
+                "Silnik pobierania:", ["Wspólny magazyn (proces)", "Równolegle (per dzień)", "Collection group"],
+                horizontal=True, key="stats_engine",
+                help="Wspólny magazyn = dane wczytane raz na proces i współdzielone przez wszystkie sesje adminów. "
+                     "Collection group = jedno zapytanie po polu `date` dla `stats` (EW nadal per dzień — "
+                     "zewnętrzny zapis EW nie ustawia `date`). "
+                     "Wymaga pola `date` w dokumentach stats (patrz Narzędzia danych na dole)."
+            )
+            use_rollups = st.checkbox(
+                "All Time z rollupów (miesiące + tylko dni po watermarku)", value=True,
+                help="Rollupy tworzy akcja 'Kompaktuj zamknięte dni' w Narzędziach danych. "
+                     "Nie dotyczy silnika 'Wspólny magazyn (proces)' — on wczytuje całą historię "
+                     "dzień po dniu raz na proces."
+            )
+            use_disk_cache = st.checkbox(
+                "Lokalny cache Parquet dla zamkniętych dni", value=True,
+                help="Dni sprzed dzisiaj czytane z dysku; z Firestore tylko dziś i dni bez cache. "
+                     "Dotyczy silnika 'Równolegle (per dzień)'."
+            )
+            use_agg_metrics = st.checkbox(
+                "Metryki z zapytania agregującego (szczegóły na żądanie)", value=False,
+                help="Rząd metryk liczony przez Firestore (sum) jednym zapytaniem, bez pobierania dokumentów. "
+                     "Wymaga licznika `diamonds` w historii (patrz Narzędzia danych). Tylko dla 'Wszyscy'."
+            )
+            use_delta = st.checkbox(
+                "Odświeżanie przyrostowe (tylko zmienione dokumenty)", value=True,
+                help="Zamknięte dni liczone raz na sesję; przy odświeżeniu pobierane są tylko "
+                     "dzisiejsze dokumenty zmienione od ostatniego odświeżenia."
+            )
+        use_group_query = fetch_engine == "Collection group"
+        use_shared_store = fetch_engine == "Wspólny magazyn (proces)"
+
+        if live_mode:
+            render_live_stats(selected_op)
+        else:
+            # --- USTALANIE LISTY DAT ---
+            dates_list = []
+            rollup = None
+            list_all_days = False
+            if date_mode == "Zakresy":
+                r = st.selectbox("Wybierz zakres:", ["Dziś", "Ostatnie 7 dni", "Ostatnie 30 dni"], key="stats_range")
+                days = 1 if r == "Dziś" else (7 if r == "Ostatnie 7 dni" else 30)
+                dates_list = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+            elif date_mode == "Kalendarz":
+                dates_list = [st.date_input("Wybierz dzień:", today).strftime("%Y-%m-%d")]
+            elif use_shared_store:
+                dates_list = get_stats_store().known_dates(db, today_str)
+            else:
+                rollup = load_all_time(db) if use_rollups else None
+                if rollup and rollup.get("watermark"):
+                    # Historia do watermarku z rollupu, na żywo tylko dni po nim
+                    dates_list = dates_after(rollup["watermark"], today_str)
+                elif not use_group_query:
+                    # Listę dni pobiera dopiero pełny odczyt — szybkim metrykom wystarczy zakres dat
+                    rollup = None
+                    list_all_days = True
+                else:
+                    # All Time + Collection group: daty wynikną z samego zapytania
+                    rollup = None
+
+            # --- SZYBKIE METRYKI: zapytanie agregujące zamiast pobierania dokumentów ---
+            fast_metrics = use_agg_metrics and selected_op == "Wszyscy"
+            if fast_metrics:
+                fast_metrics = not st.toggle("📊 Szczegóły (pełny odczyt dokumentów)", key="stats_details",
+                                             help="Ranking, przejścia i wykresy wymagają pobrania dokumentów.")
+            if fast_metrics:
+                base = rollup_totals(rollup) if rollup else None
+                if date_mode == "All Time" and not rollup:
+                    start, end = ALL_TIME_RANGE[0], today_str
+                else:
+                    # Z rollupem na żywo liczone są tylko dni po watermarku
+                    start, end = min(dates_list), max(dates_list)
+                if start <= today_str <= end:
+                    st.warning("Zakres obejmuje dziś: dzisiejszy dzień liczony z dokumentów dnia (zapisy sprzed "
+                               "wdrożenia nie mają `diamonds`), EW sumowane per dzień — zewnętrzny zapis EW "
+                               "nie ustawia `date`. Zamknięte dni wymagają uzupełnionych pól (Narzędzia danych).")
+                with st.spinner("Liczenie metryk po stronie serwera..."):
+                    metrics = headline_metrics(db, start, end, today_str, base=base)
+                num_days = (all_time_days(rollup, dates_list, today_str) if date_mode == "All Time"
+                            else max(len(dates_list), 1))
+                render_stats_metrics(metrics, num_days)
+            else:
+                # --- POBIERANIE I AGREGACJA ---
+                if list_all_days:
+                    with st.spinner("Pobieranie historii dat..."):
+                        dates_list = [ref.id for ref in db.collection(STATS_COLLECTION).list_documents()]
+                group_all_time = use_group_query and date_mode == "All Time" and rollup is None
+    
+                # Przy odświeżaniu przyrostowym otwarte dni (dziś) obsługuje tracker, reszta to dni zamknięte
+                if use_delta:
+                    open_dates = [today_str] if group_all_time else [d for d in dates_list if d >= today_str]
+                    fetch_dates = [d for d in dates_list if d < today_str]
+                else:
+                    open_dates = []
+                    fetch_dates = dates_list
+    
+                delta_key = (date_mode, tuple(dates_list), fetch_engine, use_rollups, use_disk_cache,
+                             show_hourly, rollup.get("watermark") if rollup else None)
+                delta_state = st.session_state.get("stats_delta")
+    
+                if use_shared_store:
+                    # Magazyn wspólny dla wszystkich sesji — własne filtry liczone lokalnie, bez odczytów
+                    stats_store = get_stats_store()
+                    with st.spinner("Synchronizacja wspólnego magazynu..."):
+                        stats_store.sync(db, dates_list, today_str, force=refresh_clicked)
+                    summary = stats_store.aggregate(dates_list, selected_op)
+                elif (use_delta and delta_state and delta_state["key"] == delta_key
+                      and delta_state["op"] in ("Wszyscy", selected_op)):
+                    # Odświeżenie przyrostowe: odejmij starą wersję zmienionych dokumentów, dodaj nową.
+                    # Agregat "Wszyscy" obsługuje też filtr pojedynczego operatora — bez ponownego pobierania.
+                    agg = delta_state["agg"]
+                    for coll, d_s, name, old_data, new_data in delta_state["tracker"].poll(db):
+                        if delta_state["op"] != "Wszyscy" and name != delta_state["op"]: continue
+                        if old_data is not None:
+                            add_to_agg(agg, coll, d_s, name, old_data, sign=-1)
+                        if new_data is not None:
+                            add_to_agg(agg, coll, d_s, name, new_data)
+                else:
+                    agg = new_stats_agg()
+                    # Tylko pola potrzebne widocznym widżetom (select)
+                    masks = field_masks(hourly=show_hourly)
+                    if fetch_dates or group_all_time or rollup:
+                        progress_bar = st.progress(0)
+                        last_day = None
+                        if use_group_query:
+                            # Jedno zapytanie collection group dla całego zakresu (stats + EW)
+                            if group_all_time:
+                                start, end = ALL_TIME_RANGE
+                                if use_delta: end = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+                            else:
+                                start, end = (min(fetch_dates), max(fetch_dates)) if fetch_dates else (None, None)
+                            source = iter_operator_group(db, start, end, masks=masks) if start else iter([])
+                            total_jobs = 0
+                            # Wyniki idą posortowane po `date` — postęp liczony po dniach zakresu
+                            group_span = None if group_all_time or not start else (
+                                datetime.strptime(start, "%Y-%m-%d"), datetime.strptime(end, "%Y-%m-%d"))
+                        else:
+                            # Dni (stats + ew_operator_stats) pobierane równolegle, agregacja w miarę napływu
+                            # Jeden operator: dokładne referencje przez get_all zamiast całych dni
+                            single_op = selected_op if selected_op != "Wszyscy" else None
+                            if use_disk_cache:
+                                source = iter_operator_days_cached(db, fetch_dates, today_str, operator=single_op, masks=masks)
+                            elif single_op:
+                                source = iter_operator_docs(db, fetch_dates, single_op, masks=masks)
+                            else:
+                                source = iter_operator_days(db, fetch_dates, masks=masks)
+                            total_jobs = len(fetch_dates) * len(DAY_COLLECTIONS)
+                        if rollup:
+                            rollup_chunks = list(iter_rollup_docs(rollup))
+                            source = chain(rollup_chunks, source)
+                            if total_jobs: total_jobs += len(rollup_chunks)
+            
+                        for i, (coll, d_s, docs) in enumerate(source):
+                            if total_jobs:
+                                progress_bar.progress((i + 1) / total_jobs)
+                            elif use_group_query and d_s and (coll, d_s) != last_day:
+                                last_day = (coll, d_s)
+                                if group_span:
+                                    # Najpierw stats (zapytanie grupowe), potem EW dzień po dniu — po połowie paska
+                                    done = (datetime.strptime(d_s, "%Y-%m-%d") - group_span[0]).days + 1
+                                    span = (group_span[1] - group_span[0]).days + 1
+                                    part = min(done / span, 1.0) / 2 + (0.5 if coll == EW_COLLECTION else 0)
+                                    progress_bar.progress(part, text=f"Dzień {d_s}")
+                                else:
+                                    # All Time bez znanego zakresu — tylko bieżący dzień i liczba dokumentów
+                                    progress_bar.progress(0, text=f"Dzień {d_s} · pobrano {i + 1} dokumentów")
+                            for name, data in docs:
+                                if selected_op != "Wszyscy" and name != selected_op: continue
+                                add_to_agg(agg, coll, d_s, name, data)
+                        progress_bar.empty()
+        
+                    if use_delta:
+                        tracker = DayDeltaTracker(open_dates)
+                        for coll, d_s, name, _, data in tracker.poll(db):
+                            if selected_op != "Wszyscy" and name != selected_op: continue
+                            add_to_agg(agg, coll, d_s, name, data)
+                        st.session_state.stats_delta = {"key": delta_key, "op": selected_op, "agg": agg, "tracker": tracker}
+                if not use_shared_store:
+                    summary = summarize(agg.frame(), selected_op)
+
+                if group_all_time:
+                    dates_list = summary["session_dates"]
+                num_days = (all_time_days(rollup, dates_list, today_str) if date_mode == "All Time"
+                            else max(len(dates_list), 1))
 
-    # --- DOZWOLONE MODELE AI (checkboxy) ---
-    st.subheader("🤖 Dozwolone modele AI")
-    st.caption("Zaznacz które modele mają być dostępne dla operatorów w Koordynatorze i Wieżowcu.")
+                render_stats_metrics(summary, num_days)
+
+                # --- DIAGNOSTYKA: Porównanie źródeł danych (na żądanie) ---
+                with st.expander("🔍 Diagnostyka — surowe dane z bazy", expanded=False):
+                    diag_date = dates_list[0] if dates_list else datetime.now(pytz.timezone('Europe/Warsaw')).strftime("%Y-%m-%d")
+                    st.caption(f"Data diagnostyki: **{diag_date}** · wynik trzymany w cache przez {DIAG_TTL_SECONDS}s")
+                    if st.button("▶️ Uruchom diagnostykę", key="diag_run"):
+                        # Zapamiętany wynik, nie flaga — kolejne przebiegi nie pobierają danych ponownie po TTL
+                        st.session_state.diag_result = (diag_date, *load_diagnostics(diag_date))
+                    diag_result = st.session_state.get("diag_result")
+                    if diag_result and diag_result[0] == diag_date:
+                        _, df_diag, missing = diag_result
+                        for source in missing:
+                            st.warning(f"⚠️ Brak danych w {source}")
+                        if not df_diag.empty:
+                            st.dataframe(df_diag, use_container_width=True, hide_index=True)
+
+                render_stats_details(summary, num_days, show_hourly)
+
+        # --- NARZĘDZIA DANYCH ---
+        st.markdown("---")
+        with st.expander("🛠️ Narzędzia danych", expanded=False):
+            st.caption("Jednorazowe operacje na historii statystyk. Nie trzeba ich uruchamiać przy każdym wejściu.")
+            if st.button("📅 Uzupełnij pole `date` w historycznych dokumentach (backfill)"):
+                with st.spinner("Uzupełnianie pola date w stats i ew_operator_stats..."):
+                    fixed = backfill_date_field(db)
+                st.success(f"✅ Uzupełniono {fixed} dokumentów.")
+            if st.button("🕐 Zamień `session_times` na liczniki godzinowe (migracja)"):
+                with st.spinner("Migracja dokumentów stats do session_hours..."):
+                    fixed, migrated_dates = migrate_session_times(db)
+                    # Cache Parquet, rollupy i wspólny magazyn trzymają treść sprzed migracji
+                    for d_s in migrated_dates:
+                        expire_day(d_s)
+                    months = recompact_days(db, migrated_dates)
+                    get_stats_store.clear()
+                    st.session_state.pop("stats_delta", None)
+                st.success(f"✅ Zmigrowano {fixed} dokumentów z {len(migrated_dates)} dni "
+                           f"(cache wygaszony, przeliczone rollupy: {len(months)} mies.).")
+            if st.button("💎 Uzupełnij licznik `diamonds` w zamkniętych dniach"):
+                with st.spinner("Uzupełnianie licznika diamonds w stats..."):
+                    fixed = backfill_diamonds_field(db, today_str)
+                st.success(f"✅ Uzupełniono {fixed} dokumentów.")
+            if st.button("🗜️ Kompaktuj zamknięte dni do rollupów (miesiące + All Time)"):
+                with st.spinner("Kompaktowanie zamkniętych dni..."):
+                    compacted = compact_closed_days(db, today_str)
+                if compacted:
+                    st.success(f"✅ Skompaktowano {len(compacted)} dni ({compacted[0]} … {compacted[-1]}).")
+                else:
+                    st.info("Brak nowych zamkniętych dni do skompaktowania.")
+        
+            st.markdown("**💾 Cache Parquet zamkniętych dni**")
+            cached = cached_dates()
+            st.caption(f"W cache: {len(cached)} dni" + (f" ({cached[0]} … {cached[-1]})" if cached else ""))
+            cc1, cc2 = st.columns(2)
+            with cc1:
+                if st.button("♻️ Przebuduj cache (cała historia)"):
+                    with st.spinner("Pobieranie historii do cache..."):
+                        rebuilt = rebuild_cache(db, today_str)
+                    st.success(f"✅ Przebudowano cache: {rebuilt} dni.")
+            with cc2:
+                expire_date = st.date_input("Dzień do wygaszenia:", today, key="cache_expire_date")
+                if st.button("🗑️ Wygaś dzień z cache"):
+                    removed = expire_day(expire_date.strftime("%Y-%m-%d"))
+                    st.success(f"✅ Usunięto {removed} plików — dzień zostanie pobrany ponownie.")
+
+    with tab_stats:
+        stats_section()
+
+# ==========================================
+# ⚙️ ZAKŁADKA 2: KONFIGURACJA
+# ==========================================
+if tab_config.open:
+    @st.fragment
+    @tracked(get_cost_meter, "⚙️ Konfiguracja")
+    def global_settings_section():
+        global_cfg = get_config(db, GLOBAL_SETTINGS)
+        toggle_diamonds = st.toggle("Pokazuj diamenty operatorom w Szturchaczu", value=global_cfg.get("show_diamonds", True))
+        if toggle_diamonds != global_cfg.get("show_diamonds"):
+            write_config(db, GLOBAL_SETTINGS, {"show_diamonds": toggle_diamonds})
+            rerun_fragment()
+
+        st.markdown("---")
+
+        # --- DOZWOLONE MODELE AI (checkboxy) ---
+        st.subheader("🤖 Dozwolone modele AI")
+        st.caption("Zaznacz które modele mają być dostępne dla operatorów w Koordynatorze i Wieżowcu.")
     
-    ALL_MODELS = {
-        "gemini-2.5-pro": "Gemini 2.5 Pro",
-        "gemini-3-pro-preview": "Gemini 3 Pro (Preview)",
-        "gemini-3.1-pro-preview": "Gemini 3.1 Pro (Preview)",
-    }
+        ALL_MODELS = {
+            "gemini-2.5-pro": "Gemini 2.5 Pro",
+            "gemini-3-pro-preview": "Gemini 3 Pro (Preview)",
+            "gemini-3.1-pro-preview": "Gemini 3.1 Pro (Preview)",
+        }
     
-    current_allowed = global_cfg.get("allowed_models", ["gemini-2.5-pro", "gemini-3-pro-preview"])
-    if isinstance(current_allowed, str):
-        current_allowed = [current_allowed]
+        current_allowed = global_cfg.get("allowed_models", DEFAULT_ALLOWED_MODELS)
+        if isinstance(current_allowed, str):
+            current_allowed = [current_allowed]
     
-    new_allowed = []
-    cols_m = st.columns(len(ALL_MODELS))
-    for i, (model_id, model_label) in enumerate(ALL_MODELS.items()):
-        with cols_m[i]:
-            checked = st.checkbox(model_label, value=(model_id in current_allowed), key=f"model_cb_{model_id}")
-            if checked:
-                new_allowed.append(model_id)
+        new_allowed = []
+        cols_m = st.columns(len(ALL_MODELS))
+        for i, (model_id, model_label) in enumerate(ALL_MODELS.items()):
+            with cols_m[i]:
+                checked = st.checkbox(model_label, value=(model_id in current_allowed), key=f"model_cb_{model_id}")
+                if checked:
+                    new_allowed.append(model_id)
     
-    if not new_allowed:
-        st.warning("⚠️ Musisz zaznaczyć przynajmniej jeden model!")
-        new_allowed = ["gemini-2.5-pro"]
+        if not new_allowed:
+            st.warning("⚠️ Musisz zaznaczyć przynajmniej jeden model!")
+            new_allowed = ["gemini-2.5-pro"]
     
-    if sorted(new_allowed) != sorted(current_allowed):
-        if st.button("💾 Zapisz modele", key="save_models"):
-            global_ref.set({"allowed_models": new_allowed}, merge=True)
-            st.success(f"✅ Zapisano dozwolone modele: {', '.join([ALL_MODELS[m] for m in new_allowed])}")
-            st.rerun()
-        st.info(f"🔄 Zmiana: {', '.join([ALL_MODELS[m] for m in new_allowed])} — kliknij Zapisz")
-    else:
-        st.success(f"Aktywne: {', '.join([ALL_MODELS[m] for m in current_allowed])}")
+        if sorted(new_allowed) != sorted(current_allowed):
+            if st.button("💾 Zapisz modele", key="save_models"):
+                write_config(db, GLOBAL_SETTINGS, {"allowed_models": new_allowed})
+                st.success(f"✅ Zapisano dozwolone modele: {', '.join([ALL_MODELS[m] for m in new_allowed])}")
+                rerun_fragment()
+            st.info(f"🔄 Zmiana: {', '.join([ALL_MODELS[m] for m in new_allowed])} — kliknij Zapisz")
+        else:
+            st.success(f"Aktywne: {', '.join([ALL_MODELS[m] for m in current_allowed])}")
 
-    st.markdown("---")
+        st.markdown("---")
 
-    # --- CONTEXT CACHING (Vertex AI) ---
-    st.subheader("⚡ Context Caching (Vertex AI)")
-    st.caption("Cache'uje prompt systemowy — oszczędza tokeny i przyspiesza odpowiedzi. "
-               "Cache żyje 60 min i jest współdzielony w ramach projektu GCP.")
+        # --- CONTEXT CACHING (Vertex AI) ---
+        st.subheader("⚡ Context Caching (Vertex AI)")
+        st.caption("Cache'uje prompt systemowy — oszczędza tokeny i przyspiesza odpowiedzi. "
+                   "Cache żyje 60 min i jest współdzielony w ramach projektu GCP.")
     
-    caching_enabled = global_cfg.get("context_caching_enabled", False)
-    toggle_caching = st.toggle("Włącz Context Caching", value=caching_enabled)
-    if toggle_caching != caching_enabled:
-        global_ref.set({"context_caching_enabled": toggle_caching}, merge=True)
-        if toggle_caching:
-            st.success("✅ Context Caching WŁĄCZONY — operatorzy zaczną korzystać po odświeżeniu strony.")
-        else:
-            st.info("Context Caching WYŁĄCZONY.")
-        st.rerun()
+        caching_enabled = global_cfg.get("context_caching_enabled", False)
+        toggle_caching = st.toggle("Włącz Context Caching", value=caching_enabled)
+        if toggle_caching != caching_enabled:
+            write_config(db, GLOBAL_SETTINGS, {"context_caching_enabled": toggle_caching})
+            if toggle_caching:
+                st.success("✅ Context Caching WŁĄCZONY — operatorzy zaczną korzystać po odświeżeniu strony.")
+            else:
+                st.info("Context Caching WYŁĄCZONY.")
+            rerun_fragment()
 
-    st.markdown("---")
+        st.markdown("---")
     
-    # --- ZARZĄDZANIE LISTĄ PROMPTÓW ---
-    st.subheader("📝 Zarządzanie URL-ami Promptów")
-    st.caption("Poniżej widzisz zdefiniowane prompty. Aby dodać nowy, edytuj słownik PROMPT_URLS w kodzie admin_app.py lub dodaj przez formularz poniżej.")
+    @st.fragment
+    @tracked(get_cost_meter, "⚙️ Konfiguracja")
+    def vertex_cache_section():
+        # --- CACHE VERTEX AI (podgląd, rozgrzewanie przed zmianą, sprzątanie) ---
+        with st.expander("🗄️ Cache Vertex AI w projektach"):
+            location = st.secrets.get("GCP_LOCATION")
+            if not GCP_PROJECTS or not location:
+                st.warning("⚠️ Brak GCP_PROJECT_IDS lub GCP_LOCATION w secrets Admina.")
+                return
+            caching_enabled = get_config(db, GLOBAL_SETTINGS).get("context_caching_enabled", False)
+            if not caching_enabled:
+                st.caption("Context Caching jest wyłączony — app_vertex nie korzysta z cache, rozgrzewanie zablokowane.")
+            # Modele i prompty, których app_vertex faktycznie używa — po hashu treści z rejestru promptów
+            models = VERTEX_MODELS
+            prompt_index = load_prompt_index(db)
+            prompt_names = {url: name for name, url in {**PROMPT_URLS, **load_custom_prompt_urls(),
+                                                        **APP_PROMPT_URLS}.items()}
+            urls = set(APP_PROMPT_URLS.values())
+            prompts = {prompt_index[url]["sha256"]: url for url in urls
+                       if url in prompt_index and prompt_index[url]["tokens"] >= MIN_CACHE_TOKENS}
+            names_by_sha = {prompt_index[url]["sha256"][:16]: prompt_names.get(url, url) for url in prompt_index}
+            unregistered = [prompt_names.get(url, url) for url in urls if url not in prompt_index]
+            if unregistered:
+                st.warning("Prompty spoza rejestru (pobierz je w sekcji promptów): " + ", ".join(unregistered))
+            st.caption(f"Rozgrzewanie: {len(GCP_PROJECTS)} projektów × {len(models)} modeli × {len(prompts)} promptów "
+                       f"(prompty krótsze niż {MIN_CACHE_TOKENS} tokenów pomijane).")
+
+            col_l, col_w, col_d = st.columns(3)
+            if col_l.button("📋 Pokaż cache", key="vcache_list"):
+                with st.spinner("Pobieranie listy cache..."):
+                    st.session_state.vcache_rows = list_caches(GCP_PROJECTS, location, get_vertex_credentials())
+            if col_w.button("🔥 Rozgrzej teraz", key="vcache_warm", disabled=not prompts or not caching_enabled):
+                with st.spinner("Tworzenie / przedłużanie cache..."):
+                    texts = {sha: resolve_prompt(db, url) for sha, url in prompts.items()}
+                    log = warm_caches(GCP_PROJECTS, models, texts, location, get_vertex_credentials())
+                st.dataframe(pd.DataFrame(log, columns=["Projekt", "Model", "Prompt", "Akcja"]),
+                             use_container_width=True, hide_index=True)
+                st.session_state.pop("vcache_rows", None)
+            if col_d.button("🧹 Usuń nieaktualne", key="vcache_clean"):
+                keep = {(model, sha[:16]) for model in models for sha in prompts}
+                with st.spinner("Usuwanie..."):
+                    deleted, errors = delete_stale(GCP_PROJECTS, location, get_vertex_credentials(), keep)
+                for error in errors:
+                    st.error(error)
+                st.success(f"✅ Usunięto {len(deleted)} cache.")
+                st.session_state.pop("vcache_rows", None)
+
+            rows = st.session_state.get("vcache_rows")
+            if rows is not None:
+                for row in rows:
+                    if "error" in row:
+                        st.error(f"{row['project']}: {row['error']}")
+                live = [{
+                    "Projekt": row["project"],
+                    "Model": row["model"],
+                    "Prompt": names_by_sha.get(row["sha"], row["sha"] or row["display_name"]),
+                    "Wygasa": row["expire_time"],
+                    "Pozostało [min]": int(row["remaining"].total_seconds() // 60),
+                } for row in rows if "error" not in row]
+                if live:
+                    st.dataframe(pd.DataFrame(live), use_container_width=True, hide_index=True)
+                else:
+                    st.caption("Brak żywych cache.")
+
+        st.markdown("---")
+
+    @st.fragment
+    @tracked(get_cost_meter, "⚙️ Konfiguracja")
+    def prompts_section():
+        # --- ZARZĄDZANIE LISTĄ PROMPTÓW ---
+        st.subheader("📝 Zarządzanie URL-ami Promptów")
+        st.caption("Poniżej widzisz zdefiniowane prompty. Aby dodać nowy, edytuj słownik PROMPT_URLS w kodzie admin_app.py lub dodaj przez formularz poniżej.")
     
-    # Pobierz custom prompts z bazy (oprócz hardcoded)
-    custom_prompts_ref = db.collection("admin_config").document("custom_prompts")
-    custom_prompts_data = custom_prompts_ref.get().to_dict() or {}
-    custom_prompt_urls = custom_prompts_data.get("urls", {})
+        # Pobierz custom prompts z bazy (oprócz hardcoded)
+        custom_prompt_urls = load_custom_prompt_urls()
     
-    # Połącz hardcoded + custom
-    ALL_PROMPT_URLS = {**PROMPT_URLS, **custom_prompt_urls}
+        # Połącz hardcoded + custom
+        ALL_PROMPT_URLS = {**PROMPT_URLS, **custom_prompt_urls}
     
-    with st.expander("➕ Dodaj nowy URL promptu"):
-        new_prompt_name = st.text_input("Nazwa promptu (np. 'Prompt Testowy V2'):")
-        new_prompt_url = st.text_input("URL raw z GitHuba:")
-        if st.button("Dodaj prompt"):
-            if new_prompt_name and new_prompt_url:
-                custom_prompt_urls[new_prompt_name] = new_prompt_url
-                custom_prompts_ref.set({"urls": custom_prompt_urls}, merge=True)
-                st.success(f"Dodano: {new_prompt_name}")
-                st.rerun()
-            else:
-                st.error("Wypełnij oba pola!")
+        with st.expander("➕ Dodaj nowy URL promptu"):
+            new_prompt_name = st.text_input("Nazwa promptu (np. 'Prompt Testowy V2'):")
+            new_prompt_url = st.text_input("URL raw z GitHuba:")
+            if st.button("Dodaj prompt"):
+                if new_prompt_name and new_prompt_url:
+                    custom_prompt_urls[new_prompt_name] = new_prompt_url
+                    write_config(db, CUSTOM_PROMPTS, {"urls": custom_prompt_urls})
+                    st.success(f"Dodano: {new_prompt_name}")
+                    st.rerun()  # cała aplikacja — edytor operatora też pokazuje listę promptów
+                else:
+                    st.error("Wypełnij oba pola!")
     
-    # Pokaż listę wszystkich promptów
-    if ALL_PROMPT_URLS:
-        st.write("**Dostępne prompty:**")
-        for name, url in ALL_PROMPT_URLS.items():
-            st.caption(f"• **{name}** → `{url[:80]}...`" if len(url) > 80 else f"• **{name}** → `{url}`")
+        # Pokaż listę wszystkich promptów (z danymi z rejestru: hash treści, rozmiar, tokeny)
+        # plus prompty zapisane na stałe w aplikacjach operatorów — też muszą być w rejestrze
+        REGISTRY_URLS = {**ALL_PROMPT_URLS, **APP_PROMPT_URLS}
+        if REGISTRY_URLS:
+            st.write("**Dostępne prompty:**")
+            # Okresowa kontrola zmian na GitHubie (warunkowo, z ETagiem) — tylko tutaj, nie u operatorów
+            with st.spinner("Sprawdzanie zmian w promptach..."):
+                for url, r in refresh_stale(db, REGISTRY_URLS.values()).items():
+                    if "error" in r:
+                        st.warning(f"Nie udało się sprawdzić {url}: {r['error']}")
+            prompt_index = load_prompt_index(db)
+            rows = []
+            for name, url in REGISTRY_URLS.items():
+                entry = prompt_index.get(url, {})
+                rows.append({
+                    "Prompt": name,
+                    "URL": url,
+                    "Hash": entry.get("sha256", "")[:12] or "—",
+                    "KB": round(entry["bytes"] / 1024, 1) if entry else None,
+                    "~Tokeny": entry.get("tokens"),
+                    "Pobrano": entry.get("fetched_at"),
+                })
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+            hashes = [r["Hash"] for r in rows if r["Hash"] != "—"]
+            if len(set(hashes)) < len(hashes):
+                st.caption("Prompty z tym samym hashem mają identyczną treść — przechowywane są raz.")
 
-    st.markdown("---")
+            # Treść pobierana raz tutaj; operatorzy biorą ją z rejestru po hashu zamiast z GitHuba
+            if st.button("🔄 Pobierz i zarejestruj prompty", key="prompt_registry_refresh"):
+                with st.spinner("Pobieranie promptów..."):
+                    result = refresh_registry(db, REGISTRY_URLS.values(), force=True)
+                errors = {url: r["error"] for url, r in result.items() if "error" in r}
+                for url, error in errors.items():
+                    st.error(f"{url}: {error}")
+                st.success(f"✅ Zarejestrowano {len(result) - len(errors)} z {len(result)} promptów.")
+                if not errors:
+                    rerun_fragment()
+
+        st.markdown("---")
     
-    # --- EDYCJA OPERATORA ---
-    sel_op = st.selectbox("Wybierz operatora do edycji:", OPERATORS, key="op_cfg_sel")
-    cfg_ref = db.collection("operator_configs").document(sel_op)
-    cfg = cfg_ref.get().to_dict() or {}
-
-    with st.form(key=f"form_v7_{sel_op}"):
-        col_a, col_b = st.columns(2)
-        with col_a:
-            new_pwd = st.text_input("Hasło logowania:", value=cfg.get("password", ""))
+    @st.fragment
+    @tracked(get_cost_meter, "⚙️ Konfiguracja")
+    def roster_section():
+        # --- REJESTR OPERATORÓW ---
+        st.subheader("👥 Rejestr operatorów")
+        roster = load_roster(db)
+        if not roster:
+            st.info("Rejestr jest pusty — panel używa listy startowej z kodu.")
+            if st.button("📥 Importuj listę startową", key="roster_seed"):
+                configs = load_operator_configs(tuple(DEFAULT_OPERATORS))
+                added = seed_operators(db, DEFAULT_OPERATORS, {op: c.get("role") for op, c in configs.items()})
+                st.success(f"✅ Dodano {added} operatorów.")
+                st.rerun()
+
+        col_q, col_r = st.columns([2, 1])
+        query = col_q.text_input("Szukaj operatora:", key="roster_query")
+        role_filter = col_r.selectbox("Rola:", ["Wszystkie"] + ROLES, key="roster_role")
+        found = search_roster(roster, query, None if role_filter == "Wszystkie" else role_filter)
+        if found:
+            st.dataframe(pd.DataFrame([{"Operator": name, "Rola": e["role"], "Aktywny": e["active"]}
+                                       for name, e in found.items()]),
+                         use_container_width=True, hide_index=True, height=min(400, 35 * (len(found) + 1) + 3))
+        elif roster:
+            st.caption("Brak operatorów dla tego filtra.")
+
+        with st.expander("➕ Dodaj / zmień operatora"):
+            with st.form("roster_form", clear_on_submit=True):
+                new_name = st.text_input("Login operatora:")
+                new_role = st.selectbox("Rola:", ROLES)
+                new_active = st.checkbox("Aktywny", value=True)
+                if st.form_submit_button("💾 Zapisz operatora"):
+                    new_name = new_name.strip()
+                    if not new_name or "/" in new_name:
+                        st.error("Podaj login (bez znaku '/').")
+                    else:
+                        save_operator(db, new_name, new_role, new_active)
+                        st.success(f"✅ Zapisano: {new_name}")
+                        st.rerun()  # cała aplikacja — lista operatorów jest w filtrach i edytorze
+            if st.button("🔄 Odbuduj indeks z kolekcji `operators`", key="roster_rebuild"):
+                st.success(f"✅ Indeks odbudowany: {rebuild_index(db)} operatorów.")
+                st.rerun()
+
+        st.markdown("---")
+
+    @st.fragment
+    @tracked(get_cost_meter, "⚙️ Konfiguracja")
+    def bulk_editor_section():
+        # --- EDYCJA ZBIORCZA (tabela, zapis zmienionych dokumentów w jednym WriteBatch) ---
+        with st.expander("📋 Edycja zbiorcza operatorów"):
+            ALL_PROMPT_URLS = {**PROMPT_URLS, **load_custom_prompt_urls()}
+            # Migawka, z którą porównujemy tabelę — stała do zapisu albo ponownego wczytania
+            if list(st.session_state.get("bulk_cfg_snapshot", {}).get("Operator", [])) != OPERATORS:
+                reset_bulk_editor()
+                st.session_state.bulk_cfg_snapshot = configs_frame(
+                    load_operator_configs(tuple(OPERATORS)), OPERATORS, ALL_PROMPT_URLS)
+            snapshot = st.session_state.bulk_cfg_snapshot
+            edited = st.data_editor(
+                snapshot, key="bulk_cfg_grid", hide_index=True, num_rows="fixed", use_container_width=True,
+                column_config={
+                    "Operator": st.column_config.TextColumn(disabled=True),
+                    "Klucz": st.column_config.NumberColumn(min_value=0, max_value=max(len(GCP_PROJECTS), 1), step=1,
+                                                           required=True, help="0 = losowanie"),
+                    "Prompt": st.column_config.SelectboxColumn(options=list(ALL_PROMPT_URLS)),
+                    "Rola": st.column_config.SelectboxColumn(options=ROLES, required=True),
+                    "Autopilot": st.column_config.CheckboxColumn(),
+                    "Wiadomość": st.column_config.TextColumn(width="large"),
+                })
+            updates, errors = diff_configs(snapshot, edited, ALL_PROMPT_URLS)
+            for error in errors:
+                st.error(f"❌ {error}")
+            col_s, col_r = st.columns(2)
+            if col_s.button(f"💾 Zapisz zmiany ({len(updates)} operatorów)", key="bulk_cfg_save",
+                            type="primary", disabled=not updates or bool(errors)):
+                commit_configs(db, updates)
+                save_roles(db, {op: ch["role"] for op, ch in updates.items() if "role" in ch}, ROSTER)
+                load_operator_configs.clear()
+                reset_bulk_editor()
+                st.success(f"✅ Zapisano {len(updates)} operatorów.")
+                st.rerun()  # cała aplikacja — edytor pojedynczy i rejestr pokazują te same dane
+            if col_r.button("🔄 Wczytaj ponownie", key="bulk_cfg_reload"):
+                reset_bulk_editor()
+                rerun_fragment()
+            if updates:
+                st.caption("Zmienieni: " + ", ".join(updates))
+
+    @st.fragment
+    @tracked(get_cost_meter, "⚙️ Konfiguracja")
+    def operator_editor_section():
+        # --- EDYCJA OPERATORA ---
+        ALL_PROMPT_URLS = {**PROMPT_URLS, **load_custom_prompt_urls()}
+        sel_op = st.selectbox("Wybierz operatora do edycji:", OPERATORS, key="op_cfg_sel")
+        cfg_ref = db.collection("operator_configs").document(sel_op)
+        cfg = load_operator_configs(tuple(OPERATORS)).get(sel_op, {})
+
+        with st.form(key=f"form_v7_{sel_op}"):
+            col_a, col_b = st.columns(2)
+            with col_a:
+                new_pwd = st.text_input("Hasło logowania:", value=cfg.get("password", ""))
             
-            # --- PRZYPISANIE PROJEKTU GCP (NA SZTYWNO) ---
-            if not GCP_PROJECTS:
-                st.error("⚠️ Brak GCP_PROJECT_IDS w secrets Admina!")
-                key_options = ["1 - Brak projektów w konfiguracji"]
-            else:
-                key_options = []
-                for i, p_id in enumerate(GCP_PROJECTS):
-                    key_options.append(f"{i+1} - {p_id}")
+                # --- PRZYPISANIE PROJEKTU GCP (NA SZTYWNO) ---
+                if not GCP_PROJECTS:
+                    st.error("⚠️ Brak GCP_PROJECT_IDS w secrets Admina!")
+                    key_options = ["1 - Brak projektów w konfiguracji"]
+                else:
+                    key_options = []
+                    for i, p_id in enumerate(GCP_PROJECTS):
+                        key_options.append(f"{i+1} - {p_id}")
             
-            # Aktualnie przypisany projekt
-            current_key_val = int(cfg.get("assigned_key_index", 1))
-            # Upewnij się że indeks jest w zakresie
-            if current_key_val < 1 or current_key_val > len(key_options):
-                current_key_val = 1
-            current_idx = current_key_val - 1
+                # Aktualnie przypisany projekt
+                current_key_val = int(cfg.get("assigned_key_index", 1))
+                # Upewnij się że indeks jest w zakresie
+                if current_key_val < 1 or current_key_val > len(key_options):
+                    current_key_val = 1
+                current_idx = current_key_val - 1
             
-            selected_key_str = st.selectbox(
-                "🔑 Przypisany projekt Vertex AI:", 
-                key_options, 
-                index=current_idx,
-                help="Projekt jest przypisany na sztywno. Operator zawsze korzysta z tego projektu."
-            )
-            key_choice = int(selected_key_str.split(" - ")[0])
+                selected_key_str = st.selectbox(
+                    "🔑 Przypisany projekt Vertex AI:", 
+                    key_options, 
+                    index=current_idx,
+                    help="Projekt jest przypisany na sztywno. Operator zawsze korzysta z tego projektu."
+                )
+                key_choice = int(selected_key_str.split(" - ")[0])
             
-            # Pokaż co jest aktualnie
-            if GCP_PROJECTS and current_key_val >= 1:
-                proj_name = GCP_PROJECTS[current_key_val - 1] if current_key_val - 1 < len(GCP_PROJECTS) else "?"
-                st.info(f"Aktualnie: **{proj_name}** (Klucz {current_key_val})")
-
-            # --- PRZYPISANIE PROMPTU (NA SZTYWNO) ---
-            prompt_names = list(ALL_PROMPT_URLS.keys())
-            if not prompt_names:
-                prompt_names = ["Brak promptów"]
+                # Pokaż co jest aktualnie
+                if GCP_PROJECTS and current_key_val >= 1:
+                    proj_name = GCP_PROJECTS[current_key_val - 1] if current_key_val - 1 < len(GCP_PROJECTS) else "?"
+                    st.info(f"Aktualnie: **{proj_name}** (Klucz {current_key_val})")
+
+                # --- PRZYPISANIE PROMPTU (NA SZTYWNO) ---
+                prompt_names = list(ALL_PROMPT_URLS.keys())
+                if not prompt_names:
+                    prompt_names = ["Brak promptów"]
             
-            current_prompt_url = cfg.get("prompt_url", "")
-            # Znajdź aktualny prompt po URL
-            current_prompt_idx = 0
-            for i, name in enumerate(prompt_names):
-                if ALL_PROMPT_URLS.get(name) == current_prompt_url:
-                    current_prompt_idx = i
-                    break
+                current_prompt_url = cfg.get("prompt_url", "")
+                # Znajdź aktualny prompt po URL
+                current_prompt_idx = 0
+                for i, name in enumerate(prompt_names):
+                    if ALL_PROMPT_URLS.get(name) == current_prompt_url:
+                        current_prompt_idx = i
+                        break
             
-            selected_prompt_name = st.selectbox(
-                "📄 Przypisany prompt:",
-                prompt_names,
-                index=current_prompt_idx,
-                help="Prompt jest przypisany na sztywno. Operator korzysta z tego promptu."
-            )
-            selected_prompt_url = ALL_PROMPT_URLS.get(selected_prompt_name, "")
+                selected_prompt_name = st.selectbox(
+                    "📄 Przypisany prompt:",
+                    prompt_names,
+                    index=current_prompt_idx,
+                    help="Prompt jest przypisany na sztywno. Operator korzysta z tego promptu."
+                )
+                selected_prompt_url = ALL_PROMPT_URLS.get(selected_prompt_name, "")
             
-            # --- ROLA ---
-            roles = ["Operatorzy_DE", "Operatorzy_FR", "Operatorzy_UK/PL"]
-            cur_role = cfg.get("role", "Operatorzy_DE")
-            role_sel = st.selectbox("Rola:", roles, index=roles.index(cur_role) if cur_role in roles else 0)
+                # --- ROLA ---
+                cur_role = cfg.get("role", "Operatorzy_DE")
+                role_sel = st.selectbox("Rola:", ROLES, index=ROLES.index(cur_role) if cur_role in ROLES else 0)
         
-        with col_b:
-            new_msg = st.text_area("Wiadomość dla operatora:", value=cfg.get("admin_message", ""), height=150)
-            st.write(f"Status odczytu: {'✅ Odczytano' if cfg.get('message_read', False) else '🔴 Nieodczytano'}")
+            with col_b:
+                new_msg = st.text_area("Wiadomość dla operatora:", value=cfg.get("admin_message", ""), height=150)
+                st.write(f"Status odczytu: {'✅ Odczytano' if cfg.get('message_read', False) else '🔴 Nieodczytano'}")
             
-            st.markdown("---")
-            # --- AUTOPILOT TOGGLE ---
-            autopilot_on = st.checkbox(
-                "🤖 Autopilot (ładuj nocne przeliczenie)",
-                value=cfg.get("autopilot_enabled", False),
-                help="OFF = operator czeka na AI jak zwykle. ON = ładuje gotową odpowiedź z nocnego przeliczenia."
-            )
+                st.markdown("---")
+                # --- AUTOPILOT TOGGLE ---
+                autopilot_on = st.checkbox(
+                    "🤖 Autopilot (ładuj nocne przeliczenie)",
+                    value=cfg.get("autopilot_enabled", False),
+                    help="OFF = operator czeka na AI jak zwykle. ON = ładuje gotową odpowiedź z nocnego przeliczenia."
+                )
             
-            st.markdown("---")
-            st.write("**Podgląd konfiguracji:**")
-            st.json({
-                "operator": sel_op,
-                "projekt_gcp": GCP_PROJECTS[key_choice - 1] if GCP_PROJECTS and key_choice >= 1 and key_choice <= len(GCP_PROJECTS) else "?",
-                "prompt": selected_prompt_name,
-                "rola": cur_role,
-                "autopilot": "ON" if autopilot_on else "OFF",
-            })
+                st.markdown("---")
+                st.write("**Podgląd konfiguracji:**")
+                st.json({
+                    "operator": sel_op,
+                    "projekt_gcp": GCP_PROJECTS[key_choice - 1] if GCP_PROJECTS and key_choice >= 1 and key_choice <= len(GCP_PROJECTS) else "?",
+                    "prompt": selected_prompt_name,
+                    "rola": cur_role,
+                    "autopilot": "ON" if autopilot_on else "OFF",
+                })
         
-        if st.form_submit_button("💾 Zapisz ustawienia"):
-            msg_changed = new_msg != cfg.get("admin_message", "")
-            cfg_ref.set({
-                "password": new_pwd,
-                "assigned_key_index": key_choice,
-                "prompt_url": selected_prompt_url,
-                "prompt_name": selected_prompt_name,
-                "role": role_sel,
-                "autopilot_enabled": autopilot_on,
-                "admin_message": new_msg,
-                "message_read": False if msg_changed else cfg.get("message_read", False),
-                "updated_at": firestore.SERVER_TIMESTAMP
-            }, merge=True)
-            st.success(f"✅ Zapisano konfigurację dla {sel_op}!")
-            st.rerun()
+            if st.form_submit_button("💾 Zapisz ustawienia"):
+                msg_changed = new_msg != cfg.get("admin_message", "")
+                # Zapis + licznik operatora w config_version w jednym batchu (aplikacja operatora widzi zmianę)
+                batch = db.batch()
+                batch.set(cfg_ref, {
+                    "password": new_pwd,
+                    "assigned_key_index": key_choice,
+                    "prompt_url": selected_prompt_url,
+                    "prompt_name": selected_prompt_name,
+                    "role": role_sel,
+                    "autopilot_enabled": autopilot_on,
+                    "admin_message": new_msg,
+                    "message_read": False if msg_changed else cfg.get("message_read", False),
+                    "updated_at": firestore.SERVER_TIMESTAMP
+                }, merge=True)
+                bump_versions(db, operators=[sel_op], batch=batch)
+                batch.commit()
+                load_operator_configs.clear()
+                reset_bulk_editor()
+                save_roles(db, {sel_op: role_sel}, ROSTER)
+                st.success(f"✅ Zapisano konfigurację dla {sel_op}!")
+                rerun_fragment()
+
+    with tab_config:
+        st.title("⚙️ Zarządzanie Systemem")
+        global_settings_section()
+        vertex_cache_section()
+        prompts_section()
+        roster_section()
+        bulk_editor_section()
+        operator_editor_section()
 
 # ==========================================
 # 🔑 ZAKŁADKA 3: STAN KLUCZY
 # ==========================================
-with tab_keys:
-    st.title("🔑 Monitor Zużycia Kluczy")
-    today_str = today.strftime("%Y-%m-%d")
-    key_stats = db.collection("key_usage").document(today_str).get().to_dict() or {}
+if tab_keys.open:
+    @st.fragment
+    @tracked(get_cost_meter, "🔑 Klucze")
+    def keys_section():
+        st.title("🔑 Monitor Zużycia Kluczy")
+        today_str = datetime.now(pytz.timezone('Europe/Warsaw')).strftime("%Y-%m-%d")
+        key_stats = db.collection("key_usage").document(today_str).get().to_dict() or {}
     
-    k_data = []
-    for i in range(1, len(GCP_PROJECTS) + 1):
-        usage = key_stats.get(str(i), 0)
-        proj_name = GCP_PROJECTS[i-1] if i-1 < len(GCP_PROJECTS) else "Brak projektu"
-        k_data.append({"Klucz": f"Klucz {i}", "Projekt": proj_name, "Zużycie": usage})
+        k_data = []
+        for i in range(1, len(GCP_PROJECTS) + 1):
+            usage = key_stats.get(str(i), 0)
+            proj_name = GCP_PROJECTS[i-1] if i-1 < len(GCP_PROJECTS) else "Brak projektu"
+            k_data.append({"Klucz": f"Klucz {i}", "Projekt": proj_name, "Zużycie": usage})
     
-    if k_data:
-        df_keys = pd.DataFrame(k_data)
-        st.bar_chart(df_keys.set_index("Klucz")["Zużycie"])
-        st.table(df_keys)
-    else:
-        st.warning("Brak projektów GCP w konfiguracji.")
+        if k_data:
+            df_keys = pd.DataFrame(k_data)
+            st.bar_chart(df_keys.set_index("Klucz")["Zużycie"])
+            st.table(df_keys)
+        else:
+            st.warning("Brak projektów GCP w konfiguracji.")
     
-    # --- PODGLĄD PRZYPISAŃ OPERATORÓW ---
-    st.markdown("---")
-    st.subheader("👥 Przypisania Operatorów")
-    assignments = []
-    for op in OPERATORS:
-        op_cfg = db.collection("operator_configs").document(op).get().to_dict() or {}
-        ki = int(op_cfg.get("assigned_key_index", 0))
-        proj = GCP_PROJECTS[ki - 1] if GCP_PROJECTS and 1 <= ki <= len(GCP_PROJECTS) else "Nieprzypisany"
-        prompt_name = op_cfg.get("prompt_name", "Brak")
-        assignments.append({
-            "Operator": op,
-            "Klucz": ki,
-            "Projekt GCP": proj,
-            "Prompt": prompt_name,
-            "Rola": op_cfg.get("role", "-")
-        })
-    df_assign = pd.DataFrame(assignments)
-    st.dataframe(df_assign, use_container_width=True, hide_index=True)
+        # --- PODGLĄD PRZYPISAŃ OPERATORÓW ---
+        st.markdown("---")
+        st.subheader("👥 Przypisania Operatorów")
+        assignments = []
+        op_configs = load_operator_configs(tuple(OPERATORS))
+        for op in OPERATORS:
+            op_cfg = op_configs.get(op, {})
+            ki = int(op_cfg.get("assigned_key_index", 0))
+            proj = GCP_PROJECTS[ki - 1] if GCP_PROJECTS and 1 <= ki <= len(GCP_PROJECTS) else "Nieprzypisany"
+            prompt_name = op_cfg.get("prompt_name", "Brak")
+            assignments.append({
+                "Operator": op,
+                "Klucz": ki,
+                "Projekt GCP": proj,
+                "Prompt": prompt_name,
+                "Rola": op_cfg.get("role", "-")
+            })
+        df_assign = pd.DataFrame(assignments)
+        st.dataframe(df_assign, use_container_width=True, hide_index=True)
+
+        # --- AUTOMATYCZNY PRZYDZIAŁ PROJEKTÓW (szczyt godzinowy z historii `stats`) ---
+        with st.expander("⚖️ Automatyczny przydział projektów"):
+            if len(GCP_PROJECTS) < 2:
+                st.info("Przydział ma sens od dwóch projektów GCP.")
+                return
+            st.caption("Obciążenie operatora = średnia liczba sesji w każdej godzinie z ostatnich dni. "
+                       "Propozycja minimalizuje szczyt godzinowy każdego projektu (limity Vertex są minutowe).")
+            days = st.number_input("Historia (dni):", min_value=3, max_value=60, value=DEFAULT_DAYS, key="balance_days")
+            if st.button("🧮 Zaproponuj przydział", key="balance_run"):
+                with st.spinner("Liczenie obciążenia operatorów..."):
+                    profiles = operator_profiles(db, OPERATORS, today_str, int(days))
+                current = {op: int(op_configs.get(op, {}).get("assigned_key_index", 0)) for op in OPERATORS}
+                st.session_state.balance_proposal = {
+                    "profiles": profiles, "current": current,
+                    "proposed": balance(profiles, len(GCP_PROJECTS), current),
+                }
+
+            proposal = st.session_state.get("balance_proposal")
+            if proposal:
+                profiles, current, proposed = proposal["profiles"], proposal["current"], proposal["proposed"]
+                n = len(GCP_PROJECTS)
+                st.dataframe(pd.DataFrame({
+                    "Projekt": GCP_PROJECTS,
+                    "Szczyt teraz [sesje/h]": project_peaks(current, profiles, n).round(1),
+                    "Szczyt po zmianie [sesje/h]": project_peaks({**current, **proposed}, profiles, n).round(1),
+                }), use_container_width=True, hide_index=True)
+                random_ops = [op for op in current if op not in proposed]
+                if random_ops:
+                    st.caption("Losowanie projektu (bez zmian, obciążenie liczone po równo na wszystkie projekty): "
+                               + ", ".join(random_ops))
+                changes = {op: key for op, key in proposed.items() if key != current.get(op)}
+                st.dataframe(pd.DataFrame([{
+                    "Operator": op,
+                    "Szczyt [sesje/h]": round(float(profiles[op].max()), 1),
+                    "Teraz": current[op],
+                    "Propozycja": key,
+                    "Zmiana": "🔁" if op in changes else "",
+                } for op, key in proposed.items()]), use_container_width=True, hide_index=True)
+                if st.button(f"✅ Zastosuj ({len(changes)} zmian)", key="balance_apply", type="primary",
+                             disabled=not changes):
+                    commit_configs(db, {op: {"assigned_key_index": key} for op, key in changes.items()})
+                    load_operator_configs.clear()
+                    reset_bulk_editor()
+                    del st.session_state.balance_proposal
+                    st.success(f"✅ Zmieniono przydział {len(changes)} operatorów.")
+                    rerun_fragment()
+
+    with tab_keys:
+        keys_section()
+
+# ==========================================
+# 💸 KOSZT ZAPYTANIA
+# ==========================================
+def cost_frame(rows):
+    return pd.DataFrame([{"Zakres": scope, "Odczyty": r["reads"], "Zapisy": r["writes"], "RPC": r["rpcs"],
+                        "Czas [s]": round(r["seconds"], 2), "Przebiegi": r["runs"]}
+                       for scope, r in sorted(rows.items())])
+
+with st.sidebar.expander("💸 Koszt zapytania", expanded=False):
+    run_total = sum(r["reads"] for r in cost_meter.scopes.values())
+    st.metric("Odczyty w tym przebiegu", run_total)
+    if cost_meter.scopes:
+        st.dataframe(cost_frame(cost_meter.scopes).drop(columns="Przebiegi"), use_container_width=True, hide_index=True)
+    st.caption(f"Suma dzienna ({cost_day}, wszystkie sesje panelu w tym procesie):")
+    day_rows = get_cost_log().day(cost_day)
+    if day_rows:
+        st.dataframe(cost_frame(day_rows), use_container_width=True, hide_index=True)
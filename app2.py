@@ -7,6 +7,7 @@ import locale, time, json, re, pytz, hashlib, random
 import firebase_admin
 from firebase_admin import credentials, firestore
 from streamlit_cookies_manager import EncryptedCookieManager
+from config_cache import GLOBAL_SETTINGS, bump_versions, get_config, get_operator_config, sync_config
 
 # --- 0. KONFIGURACJA ---
 st.set_page_config(page_title="Szturchacz AI - V4.6.21 (TEST)", layout="wide")
@@ -43,35 +44,58 @@ def get_pz_value(pz_string):
 def log_stats(op_name, start_pz, end_pz, key_idx):
     tz_pl = pytz.timezone('Europe/Warsaw')
     today = datetime.now(tz_pl).strftime("%Y-%m-%d")
-    time_str = datetime.now(tz_pl).strftime("%H:%M")
+    hour_str = datetime.now(tz_pl).strftime("%H")
     doc_ref = db.collection("stats").document(today).collection("operators").document(op_name)
+    # Liczniki godzinowe zamiast listy "HH:MM" — stały rozmiar dokumentu, dwie sesje w tej samej minucie się nie sklejają
+    # (set z merge nie rozwija kropek w kluczach, więc mapy zagnieżdżone)
     upd = {
+        "date": today,
+        "updated_at": firestore.SERVER_TIMESTAMP,
         "sessions_completed": firestore.Increment(1),
-        "session_times": firestore.ArrayUnion([time_str])
+        "session_hours": {hour_str: firestore.Increment(1)}
     }
     if start_pz and end_pz:
-        upd[f"pz_transitions.{start_pz}_to_{end_pz}"] = firestore.Increment(1)
+        upd["pz_transitions"] = {f"{start_pz}_to_{end_pz}": firestore.Increment(1)}
         if end_pz == "PZ6":
+            upd["diamonds"] = firestore.Increment(1)
             db.collection("global_stats").document("totals").collection("operators").document(op_name).set({"total_diamonds": firestore.Increment(1)}, merge=True)
+            cached = st.session_state.get("diamonds")
+            if cached and cached["day"] == today:
+                cached["today"] += 1
+                cached["total"] += 1
     doc_ref.set(upd, merge=True)
     db.collection("key_usage").document(today).set({str(key_idx + 1): firestore.Increment(1)}, merge=True)
 
+def get_diamonds(op_name, day):
+    """Diamenty operatora (dziś, łącznie) — z bazy raz na sesję i dzień, dalej liczone lokalnie w log_stats."""
+    cached = st.session_state.get("diamonds")
+    if not cached or cached["day"] != day:
+        today_data = db.collection("stats").document(day).collection("operators").document(op_name).get().to_dict() or {}
+        global_data = db.collection("global_stats").document("totals").collection("operators").document(op_name).get().to_dict() or {}
+        cached = st.session_state.diamonds = {
+            "day": day,
+            "today": sum(v for k, v in today_data.get("pz_transitions", {}).items() if k.endswith("_to_PZ6")),
+            "total": global_data.get("total_diamonds", 0),
+        }
+    return cached
+
 # --- TOŻSAMOŚĆ (Zaciągnięta z Routera app.py) ---
 op_name = st.session_state.operator
 cfg_ref = db.collection("operator_configs").document(op_name)
-cfg = cfg_ref.get().to_dict() or {}
+# Jeden odczyt admin_config/config_version na przebieg — konfiguracja operatora i ustawienia globalne
+# z pamięci procesu, pobierane ponownie tylko po zmianie w panelu admina
+config_versions = sync_config(db)
+cfg = get_operator_config(db, op_name, config_versions)
 
-# Pobieranie ustawień globalnych
-global_cfg = db.collection("admin_config").document("global_settings").get().to_dict() or {}
+# Pobieranie ustawień globalnych (z pamięci procesu — pobierane ponownie po zmianie w config_version)
+global_cfg = get_config(db, GLOBAL_SETTINGS)
 show_diamonds_globally = global_cfg.get("show_diamonds", True)
 
 # Pobieranie danych diamentów
 tz_pl = pytz.timezone('Europe/Warsaw')
 today_s = datetime.now(tz_pl).strftime("%Y-%m-%d")
-today_data = db.collection("stats").document(today_s).collection("operators").document(op_name).get().to_dict() or {}
-today_diamonds = sum(v for k, v in today_data.get("pz_transitions", {}).items() if k.endswith("_to_PZ6"))
-global_data = db.collection("global_stats").document("totals").collection("operators").document(op_name).get().to_dict() or {}
-all_time_diamonds = global_data.get("total_diamonds", 0)
+diamonds = get_diamonds(op_name, today_s)
+today_diamonds, all_time_diamonds = diamonds["today"], diamonds["total"]
 
 API_KEYS = st.secrets["API_KEYS"]
 MODEL_MAP = {
@@ -114,7 +138,11 @@ with st.sidebar:
         if not msg_read:
             st.error(f"📢 **WIADOMOŚĆ:**\n\n{admin_msg}")
             if st.button("✅ Odczytałem"):
-                cfg_ref.update({"message_read": True})
+                # Licznik operatora w config_version — inne sesje też przestaną pokazywać wiadomość
+                batch = db.batch()
+                batch.update(cfg_ref, {"message_read": True})
+                bump_versions(db, operators=[op_name], batch=batch)
+                batch.commit()
                 st.rerun()
         else:
             with st.expander("📩 Poprzednia wiadomość"): st.write(admin_msg)
@@ -1,4 +1,3 @@
-import requests
 import streamlit as st
 import vertexai
 from vertexai.generative_models import GenerativeModel, ChatSession, Content, Part
@@ -9,6 +8,9 @@ import locale, time, json, re, pytz, hashlib, random
 import firebase_admin
 from firebase_admin import credentials, firestore
 from streamlit_cookies_manager import EncryptedCookieManager
+from config_cache import GLOBAL_SETTINGS, bump_versions, get_config, get_operator_config, sync_config
+from prompt_registry import VERTEX_PROMPT_URL, content_hash, resolve_prompt
+from vertex_cache import VERTEX_MODELS, cached_model, find_cache
 
 # --- 0. KONFIGURACJA ŚRODOWISKA ---
 try: locale.setlocale(locale.LC_TIME, "pl_PL.UTF-8")
@@ -31,7 +33,10 @@ except:
 # ==========================================
 op_name = st.session_state.operator
 cfg_ref = db.collection("operator_configs").document(op_name)
-cfg = cfg_ref.get().to_dict() or {}
+# Jeden odczyt admin_config/config_version na przebieg — konfiguracja operatora i ustawienia globalne
+# z pamięci procesu, pobierane ponownie tylko po zmianie w panelu admina
+config_versions = sync_config(db)
+cfg = get_operator_config(db, op_name, config_versions)
 
 # Wybór projektu (Admin > Losowanie)
 fixed_key_idx = cfg.get("assigned_key_index", 0)
@@ -73,24 +78,48 @@ def parse_pz(text):
 def log_stats(op_name, start_pz, end_pz, proj_idx):
     tz_pl = pytz.timezone('Europe/Warsaw')
     today = datetime.now(tz_pl).strftime("%Y-%m-%d")
-    time_str = datetime.now(tz_pl).strftime("%H:%M")
+    hour_str = datetime.now(tz_pl).strftime("%H")
     doc_ref = db.collection("stats").document(today).collection("operators").document(op_name)
+    # Liczniki godzinowe zamiast listy "HH:MM" — stały rozmiar dokumentu, dwie sesje w tej samej minucie się nie sklejają
+    # (set z merge nie rozwija kropek w kluczach, więc mapy zagnieżdżone)
     upd = {
+        "date": today,
+        "updated_at": firestore.SERVER_TIMESTAMP,
         "sessions_completed": firestore.Increment(1),
-        "session_times": firestore.ArrayUnion([time_str])
+        "session_hours": {hour_str: firestore.Increment(1)}
     }
     if start_pz and end_pz:
-        upd[f"pz_transitions.{start_pz}_to_{end_pz}"] = firestore.Increment(1)
+        upd["pz_transitions"] = {f"{start_pz}_to_{end_pz}": firestore.Increment(1)}
         if end_pz == "PZ6":
+            upd["diamonds"] = firestore.Increment(1)
             db.collection("global_stats").document("totals").collection("operators").document(op_name).set({"total_diamonds": firestore.Increment(1)}, merge=True)
+            cached = st.session_state.get("diamonds")
+            if cached and cached["day"] == today:
+                cached["today"] += 1
+                cached["total"] += 1
     doc_ref.set(upd, merge=True)
     db.collection("key_usage").document(today).set({str(proj_idx + 1): firestore.Increment(1)}, merge=True)
 
+def get_diamonds(op_name, day):
+    """Diamenty operatora (dziś, łącznie) — z bazy raz na sesję i dzień, dalej liczone lokalnie w log_stats."""
+    cached = st.session_state.get("diamonds")
+    if not cached or cached["day"] != day:
+        today_data = db.collection("stats").document(day).collection("operators").document(op_name).get().to_dict() or {}
+        global_data = db.collection("global_stats").document("totals").collection("operators").document(op_name).get().to_dict() or {}
+        cached = st.session_state.diamonds = {
+            "day": day,
+            "today": sum(v for k, v in today_data.get("pz_transitions", {}).items() if k.endswith("_to_PZ6")),
+            "total": global_data.get("total_diamonds", 0),
+        }
+    return cached
+
 # ==========================================
 # 🚀 SIDEBAR
 # ==========================================
-global_cfg = db.collection("admin_config").document("global_settings").get().to_dict() or {}
+# Ustawienia globalne z pamięci procesu — pobierane ponownie po zmianie w config_version
+global_cfg = get_config(db, GLOBAL_SETTINGS)
 show_diamonds = global_cfg.get("show_diamonds", True)
+use_context_cache = global_cfg.get("context_caching_enabled", False)
 
 with st.sidebar:
     st.title(f"👤 {op_name}")
@@ -99,22 +128,23 @@ with st.sidebar:
     if show_diamonds:
         tz_pl = pytz.timezone('Europe/Warsaw')
         today_s = datetime.now(tz_pl).strftime("%Y-%m-%d")
-        today_data = db.collection("stats").document(today_s).collection("operators").document(op_name).get().to_dict() or {}
-        today_diamonds = sum(v for k, v in today_data.get("pz_transitions", {}).items() if k.endswith("_to_PZ6"))
-        global_data = db.collection("global_stats").document("totals").collection("operators").document(op_name).get().to_dict() or {}
-        all_time_diamonds = global_data.get("total_diamonds", 0)
-        st.markdown(f"### 💎 Zamówieni kurierzy\n**Dziś:** {today_diamonds} | **Łącznie:** {all_time_diamonds}")
+        diamonds = get_diamonds(op_name, today_s)
+        st.markdown(f"### 💎 Zamówieni kurierzy\n**Dziś:** {diamonds['today']} | **Łącznie:** {diamonds['total']}")
         st.markdown("---")
 
     admin_msg = cfg.get("admin_message", "")
     if admin_msg and not cfg.get("message_read", False):
         st.error(f"📢 **WIADOMOŚĆ:**\n\n{admin_msg}")
         if st.button("✅ Odczytałem"):
-            db.collection("operator_configs").document(op_name).update({"message_read": True})
+            # Licznik operatora w config_version — inne sesje też przestaną pokazywać wiadomość
+            batch = db.batch()
+            batch.update(cfg_ref, {"message_read": True})
+            bump_versions(db, operators=[op_name], batch=batch)
+            batch.commit()
             st.rerun()
 
     st.markdown("---")
-    st.radio("Model AI:", ["gemini-2.5-pro", "gemini-2.5-flash"], key="selected_model_label")
+    st.radio("Model AI:", VERTEX_MODELS, key="selected_model_label")
     active_model_id = st.session_state.selected_model_label
     
     # --- PARAMETRY V21 (notag domyślnie TAK) ---
@@ -151,19 +181,31 @@ st.title(f"🤖 Szturchacz (Vertex)")
 if "chat_started" not in st.session_state: st.session_state.chat_started = False
 
 
-# --- FUNKCJA POBIERANIA PROMPTU Z GITHUB ---
-@st.cache_data(ttl=3600)  # Cache na 1 godzinę
+# --- FUNKCJA POBIERANIA PROMPTU (rejestr promptów po hashu, GitHub tylko gdy URL-a nie ma w rejestrze) ---
 def get_remote_prompt(url):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
+        return resolve_prompt(db, url)
     except Exception as e:
         st.error(f"Błąd pobierania promptu z GitHub: {e}")
         return ""
 
-# TWÓJ LINK RAW Z GITHUBA (Wklej tutaj swój link):
-PROMPT_URL = "https://raw.githubusercontent.com/szturchaczysko-cpu/szturchacz/refs/heads/main/prompt4622.txt"
+# --- CACHE KONTEKSTU (rozgrzewany w panelu admina, szukany po modelu i hashu promptu) ---
+CACHE_RECHECK_SECONDS = 600
+
+def get_cached_content(model_id, prompt_text, drop=False):
+    """Cache promptu z panelu w bieżącym projekcie albo None — lista cache sprawdzana raz na CACHE_RECHECK_SECONDS."""
+    key = (current_gcp_project, model_id, content_hash(prompt_text))
+    found = st.session_state.setdefault("vertex_caches", {}).get(key)
+    if drop or found is None or time.time() - found[1] >= CACHE_RECHECK_SECONDS:
+        try:
+            found = (None if drop else find_cache(model_id, key[2]), time.time())
+        except Exception:
+            found = (None, time.time())
+        st.session_state.vertex_caches[key] = found
+    return found[0]
+
+# TWÓJ LINK RAW Z GITHUBA (zmiana w prompt_registry.VERTEX_PROMPT_URL — panel admina rejestruje ten sam URL):
+PROMPT_URL = VERTEX_PROMPT_URL
 
 
 if not st.session_state.chat_started:
@@ -194,11 +236,11 @@ analizbior={p_analizbior}
 """
     FULL_PROMPT = SYSTEM_PROMPT + parametry_startowe
 
-    def get_vertex_history():
+    def get_vertex_history(prefix=""):
         vh = []
-        for m in st.session_state.messages[:-1]:
+        for i, m in enumerate(st.session_state.messages[:-1]):
             role = "user" if m["role"] == "user" else "model"
-            vh.append(Content(role=role, parts=[Part.from_text(m["content"])]))
+            vh.append(Content(role=role, parts=[Part.from_text(prefix + m["content"] if i == 0 else m["content"])]))
         return vh
 
     # Wyświetlanie historii
@@ -212,11 +254,19 @@ analizbior={p_analizbior}
                 max_attempts = 3
                 success = False
                 for attempt in range(max_attempts):
+                    # Z cache: prompt systemowy z panelu, parametry startowe na początku pierwszej wiadomości
+                    cached = get_cached_content(active_model_id, SYSTEM_PROMPT) if use_context_cache else None
                     try:
-                        model = GenerativeModel(active_model_id, system_instruction=FULL_PROMPT)
-                        history = get_vertex_history()
+                        if cached is not None:
+                            model, prefix = cached_model(cached), parametry_startowe + "\n"
+                        else:
+                            model, prefix = GenerativeModel(active_model_id, system_instruction=FULL_PROMPT), ""
+                        history = get_vertex_history(prefix)
+                        last_msg = st.session_state.messages[-1]["content"]
+                        if len(st.session_state.messages) == 1:
+                            last_msg = prefix + last_msg
                         chat = model.start_chat(history=history)
-                        response = chat.send_message(st.session_state.messages[-1]["content"], generation_config={"temperature": 0.0})
+                        response = chat.send_message(last_msg, generation_config={"temperature": 0.0})
                         
                         st.markdown(response.text)
                         st.session_state.messages.append({"role": "model", "content": response.text})
@@ -231,6 +281,9 @@ analizbior={p_analizbior}
                         if "429" in str(e) or "Quota" in str(e):
                             st.toast(f"⏳ Limit minuty. Próba {attempt+1}/{max_attempts}...")
                             time.sleep(5)
+                        elif cached is not None:
+                            # Cache wygasł lub usunięty — kolejna próba z pełnym promptem
+                            get_cached_content(active_model_id, SYSTEM_PROMPT, drop=True)
                         else:
                             st.error(f"Błąd Vertex AI: {e}")
                             break
@@ -0,0 +1,171 @@
+"""Benchmark panelu admina na syntetycznej historii (in-memory fake Firestore).
+
+Generuje N dni x M operatorów w stats, ew_operator_stats, global_stats i key_usage,
+po czym uruchamia admin_app.py przez streamlit.testing.v1.AppTest dla każdego trybu
+dat ("Dziś", 7 dni, 30 dni, "All Time") i filtra operatora. Dla każdego scenariusza
+mierzy pierwszy przebieg (zimny: pusty cache procesu i dysku) i ponowny przebieg
+(ciepły) — czas oraz odczyty/RPC policzone przez fake.
+
+    python bench/bench_admin.py --days 120 --operators 13
+    python bench/bench_admin.py --engine "Równolegle (per dzień)" --csv bench_output.csv
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = tempfile.mkdtemp(prefix="stats_cache_bench_")
+os.environ["STATS_CACHE_DIR"] = CACHE_DIR  # przed importem stats_cache (przez admin_app)
+sys.path.insert(0, ROOT)
+
+import firebase_admin
+import pandas as pd
+import pytz
+import streamlit as st
+from firebase_admin import firestore
+from streamlit.testing.v1 import AppTest
+
+from fake_firestore import FakeFirestore
+from config_cache import invalidate_config
+from operator_registry import seed_operators
+
+APP_PATH = os.path.join(ROOT, "admin_app.py")
+OPERATORS = ["Emilia", "Oliwia", "Iwona", "Marlena", "Magda", "Sylwia", "Ewelina", "Klaudia", "Marta",
+             "EwelinaG", "Andrzej", "Romana", "Kasia"]
+ENGINES = ["Wspólny magazyn (proces)", "Równolegle (per dzień)", "Collection group"]
+DATE_SCENARIOS = [("Zakresy", "Dziś"), ("Zakresy", "Ostatnie 7 dni"), ("Zakresy", "Ostatnie 30 dni"),
+                  ("All Time", None)]
+# Dni starsze niż tyle mają stary format (lista "HH:MM" w session_times), nowsze liczniki session_hours
+LEGACY_AFTER_DAYS = 30
+
+
+def seed_history(db, days, operators, keys=3, seed=1):
+    """Syntetyczna historia: sesje w godzinach pracy, łańcuchy PZ z diamentami (PZ6), casy EW."""
+    rnd = random.Random(seed)
+    today = datetime.now(pytz.timezone("Europe/Warsaw"))
+    totals = dict.fromkeys(operators, 0)
+    for i in range(days):
+        d_s = (today - timedelta(days=i)).strftime("%Y-%m-%d")
+        usage = {}
+        for op in operators:
+            if rnd.random() < 0.15:  # dzień wolny
+                continue
+            sessions = rnd.randint(5, 40)
+            transitions = {}
+            hours = {}
+            times = []
+            for _ in range(sessions):
+                start = rnd.randint(0, 5)
+                end = min(6, start + rnd.choice((0, 1, 1, 2, 3)))
+                if end != start:
+                    key = f"PZ{start}_to_PZ{end}"
+                    transitions[key] = transitions.get(key, 0) + 1
+                t = f"{rnd.randint(7, 17):02d}:{rnd.randint(0, 59):02d}"
+                times.append(t)
+                hours[t[:2]] = hours.get(t[:2], 0) + 1
+                k = str(rnd.randint(1, keys))
+                usage[k] = usage.get(k, 0) + 1
+            diamonds = sum(v for k, v in transitions.items() if k.endswith("_to_PZ6"))
+            totals[op] += diamonds
+            doc = {"date": d_s, "sessions_completed": sessions, "pz_transitions": transitions}
+            if i > LEGACY_AFTER_DAYS:
+                doc["session_times"] = sorted(set(times))
+            else:
+                doc.update({"session_hours": hours, "diamonds": diamonds, "updated_at": today})
+            db.collection("stats").document(d_s).collection("operators").document(op).set(doc)
+            db.collection("ew_operator_stats").document(d_s).collection("operators").document(op).set(
+                {"date": d_s, "cases_completed": rnd.randint(0, sessions // 2)})
+        db.collection("key_usage").document(d_s).set(usage)
+    for n, op in enumerate(operators):
+        db.collection("global_stats").document("totals").collection("operators").document(op).set(
+            {"total_diamonds": totals[op]})
+        db.collection("operator_configs").document(op).set(
+            {"assigned_key_index": n % keys + 1, "role": "Operatorzy_DE", "prompt_name": "Prompt Stabilny (prompt4623)"})
+    seed_operators(db, operators)
+
+
+def new_app(keys):
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    at.secrets["FIREBASE_CREDS"] = "{}"
+    at.secrets["ADMIN_PASSWORD"] = "bench"
+    at.secrets["GCP_PROJECT_IDS"] = [f"bench-project-{i}" for i in range(1, keys + 1)]
+    at.session_state["password_correct"] = True
+    return at
+
+
+def timed_run(at, fake):
+    fake.stats.reset()
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed, fake.stats.reads, fake.stats.rpcs
+
+
+def run_scenario(fake, keys, engine, date_mode, date_range, operator):
+    # Zimny start: pusty cache procesu (st.cache_*, config_cache) i pusty cache Parquet
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    invalidate_config()
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    at = new_app(keys)
+    at.session_state["stats_engine"] = engine
+    at.session_state["stats_date_mode"] = date_mode
+    at.session_state["stats_op"] = operator
+    if date_range:
+        at.session_state["stats_range"] = date_range
+    cold = timed_run(at, fake)
+    warm = timed_run(at, fake)
+    return {
+        "Zakres": date_range or date_mode, "Operator": operator, "Silnik": engine,
+        "Zimny [s]": round(cold[0], 3), "Ciepły [s]": round(warm[0], 3),
+        "Odczyty (zimny)": cold[1], "Odczyty (ciepły)": warm[1],
+        "RPC (zimny)": cold[2], "RPC (ciepły)": warm[2],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=90, help="liczba dni historii")
+    parser.add_argument("--operators", type=int, default=len(OPERATORS), help="liczba operatorów")
+    parser.add_argument("--keys", type=int, default=3, help="liczba kluczy / projektów GCP")
+    parser.add_argument("--engine", choices=ENGINES, action="append",
+                        help="silnik pobierania (można podać kilka razy); domyślnie wszystkie")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--csv", help="zapisz wyniki do pliku CSV")
+    args = parser.parse_args()
+    # AppTest działa bez serwera — ostrzeżenia Streamlita o braku runtime tylko zaśmiecają wynik
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    operators = OPERATORS[:args.operators] + [f"Operator{i}" for i in range(len(OPERATORS) + 1, args.operators + 1)]
+    fake = FakeFirestore()
+    seed_history(fake, args.days, operators, args.keys, args.seed)
+    firebase_admin._apps.setdefault("[DEFAULT]", object())
+    firestore.client = lambda *a, **k: fake
+
+    rows = []
+    try:
+        for engine in args.engine or ENGINES:
+            for date_mode, date_range in DATE_SCENARIOS:
+                for operator in ("Wszyscy", operators[0]):
+                    rows.append(run_scenario(fake, args.keys, engine, date_mode, date_range, operator))
+                    print(f"  {engine} · {date_range or date_mode} · {operator}", file=sys.stderr)
+    finally:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    df = pd.DataFrame(rows)
+    print(f"\nHistoria: {args.days} dni x {len(operators)} operatorów\n")
+    print(df.to_string(index=False))
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""In-memory fake klienta Firestore do benchmarków panelu admina.
+
+Odwzorowuje tylko to, czego używa admin_app.py: kolekcje/dokumenty/subkolekcje,
+set/update z transformacjami (Increment, ArrayUnion, DELETE_FIELD, SERVER_TIMESTAMP),
+zapytania where/select/order_by/limit, collection_group, get_all, list_documents,
+WriteBatch, zapytania agregujące count/sum i on_snapshot. Odczyty, zapisy i RPC są
+liczone w `stats` tak, jak rozlicza je Firestore.
+"""
+import copy
+import threading
+import time
+from datetime import datetime, timezone
+
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class FakeStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+
+    def add(self, reads=0, writes=0, rpcs=1):
+        with self.lock:
+            self.reads += reads
+            self.writes += writes
+            self.rpcs += rpcs
+
+
+def _parts(path):
+    return list(FieldPath.from_string(path).parts)
+
+
+def _get_path(data, path):
+    cur = data
+    for part in _parts(path):
+        if not isinstance(cur, dict) or part not in cur:
+            return None
+        cur = cur[part]
+    return cur
+
+
+def _apply_value(current, value, now):
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, transforms.Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        cur = list(current) if isinstance(current, list) else []
+        return cur + [v for v in value.values if v not in cur]
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in (current or []) if v not in value.values]
+    if isinstance(value, dict):
+        return _merge({}, value, now)
+    return value
+
+
+def _merge(target, data, now):
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value, now)
+        else:
+            target[key] = _apply_value(target.get(key), value, now)
+    return target
+
+
+def _set_path(target, path, value, now):
+    parts = _parts(path)
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    if value is transforms.DELETE_FIELD:
+        target.pop(parts[-1], None)
+    else:
+        target[parts[-1]] = _apply_value(target.get(parts[-1]), value, now)
+
+
+def _project(data, fields):
+    if fields is None:
+        return data
+    out = {}
+    for f in fields:
+        v = _get_path(data, f)
+        if v is not None:
+            _set_path(out, f, v, None)
+    return out
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data, update_time=None, create_time=None):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+        self.create_time = create_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _get_path(self._data or {}, field)
+
+
+class _Doc:
+    __slots__ = ("data", "update_time", "create_time")
+
+    def __init__(self):
+        self.data = None
+        self.update_time = None
+        self.create_time = None
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return FakeCollectionReference(self._client, f"{self.path}/{name}")
+
+    def _snapshot(self, field_paths=None):
+        doc = self._client._docs.get(self.path)
+        if doc is None or doc.data is None:
+            return FakeSnapshot(self, None)
+        return FakeSnapshot(self, _project(doc.data, field_paths), doc.update_time, doc.create_time)
+
+    def get(self, field_paths=None, transaction=None):
+        self._client.stats.add(reads=1)
+        return self._snapshot(field_paths)
+
+    def _write(self, fn):
+        with self._client._lock:
+            doc = self._client._docs.setdefault(self.path, _Doc())
+            now = self._client._tick()
+            if doc.data is None:
+                doc.data = {}
+                doc.create_time = now
+            fn(doc, now)
+            doc.update_time = now
+        self._client._notify(self.path)
+
+    # _apply_*: sam zapis bez liczenia (używany też przez WriteBatch.commit)
+    def _apply_set(self, data, merge=False):
+        def fn(doc, now):
+            if not merge:
+                doc.data = {}
+            _merge(doc.data, data, now)
+        self._write(fn)
+
+    def _apply_update(self, data):
+        if self.path not in self._client._docs:
+            raise KeyError(f"No document to update: {self.path}")
+
+        def fn(doc, now):
+            for key, value in data.items():
+                _set_path(doc.data, key, value, now)
+        self._write(fn)
+
+    def _apply_delete(self):
+        with self._client._lock:
+            self._client._docs.pop(self.path, None)
+        self._client._notify(self.path)
+
+    def set(self, data, merge=False):
+        self._client.stats.add(writes=1)
+        self._apply_set(data, merge)
+
+    def update(self, data):
+        self._client.stats.add(writes=1)
+        self._apply_update(data)
+
+    def delete(self):
+        self._client.stats.add(writes=1)
+        self._apply_delete()
+
+    def on_snapshot(self, callback):
+        return self._client._watch(_DocQuery(self), callback)
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query):
+        self._query = query
+        self._aggs = []
+
+    def count(self, alias=None):
+        self._aggs.append(("count", None, alias or "count"))
+        return self
+
+    def sum(self, field, alias=None):
+        self._aggs.append(("sum", field, alias or "sum"))
+        return self
+
+    def get(self, transaction=None):
+        docs = self._query._matching()
+        # Zapytania agregujące: 1 odczyt na 1000 dopasowanych dokumentów (min. 1)
+        self._query._client.stats.add(reads=max(1, (len(docs) + 999) // 1000))
+        out = []
+        for kind, field, alias in self._aggs:
+            if kind == "count":
+                value = len(docs)
+            else:
+                value = sum(v for v in (_get_path(d.data, field) for _, d in docs) if isinstance(v, (int, float)))
+            out.append(FakeAggregationResult(alias, value))
+        return [out]
+
+
+class FakeQuery:
+    def __init__(self, client, parent_path=None, group=None, filters=(), fields=None, order=None, limit=None,
+                 after=None):
+        self._client = client
+        self._parent_path = parent_path
+        self._group = group
+        self._filters = list(filters)
+        self._fields = fields
+        self._order = order
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **kw):
+        args = dict(parent_path=self._parent_path, group=self._group, filters=self._filters,
+                    fields=self._fields, order=self._order, limit=self._limit, after=self._after)
+        args.update(kw)
+        return FakeQuery(self._client, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(order=(field_path, direction))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        # Kursor po snapshocie: dokumenty za nim w bieżącym porządku
+        return self._copy(after=snapshot.reference.path)
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self).count(alias)
+
+    def sum(self, field_ref, alias=None):
+        return FakeAggregationQuery(self).sum(field_ref, alias)
+
+    def _matching(self):
+        with self._client._lock:
+            items = list(self._client._docs.items())
+        out = []
+        for path, doc in items:
+            if doc.data is None:
+                continue
+            parent, _, _ = path.rpartition("/")
+            if self._group is not None:
+                if parent.rsplit("/", 1)[-1] != self._group:
+                    continue
+            elif parent != self._parent_path:
+                continue
+            if all(_OPS[op](_get_path(doc.data, f), v) for f, op, v in self._filters):
+                out.append((path, doc))
+        if self._order:
+            field, direction = self._order
+            out.sort(key=lambda x: (_get_path(x[1].data, field) is None, _get_path(x[1].data, field) or 0)
+                     if field != "__name__" else x[0], reverse=direction == "DESCENDING")
+        else:
+            out.sort(key=lambda x: x[0])
+        if self._after is not None:
+            paths = [path for path, _ in out]
+            out = out[paths.index(self._after) + 1:] if self._after in paths else out
+        if self._limit is not None:
+            out = out[:self._limit]
+        return out
+
+    def stream(self, transaction=None):
+        docs = self._matching()
+        self._client.stats.add(reads=max(1, len(docs)))
+        for path, doc in docs:
+            ref = FakeDocumentReference(self._client, path)
+            yield FakeSnapshot(ref, _project(doc.data, self._fields), doc.update_time, doc.create_time)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._client._watch(self, callback)
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, parent_path=path)
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self.path:
+            return None
+        return FakeDocumentReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, f"{self.path}/{doc_id}")
+
+    def list_documents(self, page_size=None):
+        prefix = self.path + "/"
+        ids = set()
+        with self._client._lock:
+            for path in self._client._docs:
+                if path.startswith(prefix):
+                    ids.add(path[len(prefix):].split("/", 1)[0])
+        self._client.stats.add(reads=max(1, len(ids)))
+        return [self.document(i) for i in sorted(ids)]
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(("set", ref, data, merge))
+
+    def update(self, ref, data):
+        self._ops.append(("update", ref, data, None))
+
+    def delete(self, ref):
+        self._ops.append(("delete", ref, None, None))
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise ValueError("WriteBatch limit is 500 operations")
+        self._client.stats.add(writes=len(self._ops))
+        for kind, ref, data, merge in self._ops:
+            if kind == "set":
+                ref._apply_set(data, merge)
+            elif kind == "update":
+                ref._apply_update(data)
+            else:
+                ref._apply_delete()
+        self._ops = []
+
+
+class _DocQuery:
+    """Nasłuch pojedynczego dokumentu — callback dostaje [snapshot] nawet gdy go nie ma."""
+
+    def __init__(self, ref):
+        self.ref = ref
+        self.single = True
+
+    def _matching(self):
+        doc = self.ref._client._docs.get(self.ref.path)
+        return [(self.ref.path, doc)] if doc is not None and doc.data is not None else []
+
+
+class _Watch:
+    def __init__(self, client, query, callback):
+        self.client = client
+        self.query = query
+        self.callback = callback
+        self.known = {}
+        self.fired = False
+
+    def fire(self):
+        docs = {p: d for p, d in self.query._matching()}
+        changes = []
+        for path, doc in docs.items():
+            if self.known.get(path) != doc.update_time:
+                kind = "ADDED" if path not in self.known else "MODIFIED"
+                changes.append(_Change(kind, FakeSnapshot(FakeDocumentReference(self.client, path),
+                                                          dict(doc.data), doc.update_time, doc.create_time)))
+        for path in set(self.known) - set(docs):
+            changes.append(_Change("REMOVED", FakeSnapshot(FakeDocumentReference(self.client, path), None)))
+        first = not self.fired
+        self.fired = True
+        self.known = {p: d.update_time for p, d in docs.items()}
+        if getattr(self.query, "single", False):
+            if changes or first:
+                self.client.stats.add(reads=1, rpcs=0)
+                self.callback([self.query.ref._snapshot()], changes, self.client._now)
+        elif changes or first:
+            self.client.stats.add(reads=len(changes), rpcs=0)
+            self.callback([FakeSnapshot(FakeDocumentReference(self.client, p), dict(d.data), d.update_time)
+                           for p, d in docs.items()], changes, self.client._now)
+
+    def unsubscribe(self):
+        self.client._watches.discard(self)
+
+
+class _ChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Change:
+    def __init__(self, kind, snapshot):
+        self.type = _ChangeType(kind)
+        self.document = snapshot
+
+
+class FakeFirestore:
+    def __init__(self):
+        self._docs = {}
+        self._lock = threading.RLock()
+        self._clock = 0
+        self._now = datetime.now(timezone.utc)
+        self._watches = set()
+        self.stats = FakeStats()
+
+    def _tick(self):
+        self._clock += 1
+        self._now = datetime.fromtimestamp(time.time() + self._clock * 1e-6, tz=timezone.utc)
+        return self._now
+
+    def _notify(self, path):
+        for w in list(self._watches):
+            w.fire()
+
+    def _watch(self, query, callback):
+        w = _Watch(self, query, callback)
+        self._watches.add(w)
+        w.fire()
+        return w
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def collection_group(self, name):
+        return FakeQuery(self, group=name)
+
+    def document(self, path):
+        return FakeDocumentReference(self, path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        refs = list(references)
+        self.stats.add(reads=len(refs))
+        for ref in refs:
+            yield ref._snapshot(field_paths)
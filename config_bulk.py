@@ -0,0 +1,104 @@
+"""Zbiorcza edycja operator_configs (tabela w panelu admina).
+
+configs_frame() buduje tabelę z wczytanych konfiguracji, diff_configs() porównuje
+edytowaną tabelę z tym stanem i zwraca tylko zmienione pola zmienionych
+operatorów (wyczyszczone komórki: tekst = "", pola wymagane = błąd walidacji),
+commit_configs() zapisuje je w WriteBatch (jeden RPC na BATCH_LIMIT
+dokumentów zamiast osobnego zapisu i przeładowania strony na operatora).
+"""
+import pandas as pd
+from firebase_admin import firestore
+
+from config_cache import bump_versions
+from operator_registry import DEFAULT_ROLE
+from stats_fetch import BATCH_LIMIT, commit_in_batches
+
+CONFIGS_COLLECTION = "operator_configs"
+
+# Kolumna tabeli -> (pole dokumentu, typ) — typy Pythona zamiast numpy dla klienta Firestore.
+# Prompt i wiadomość obsługiwane osobno w diff_configs.
+GRID_FIELDS = {
+    "Hasło": ("password", str),
+    "Klucz": ("assigned_key_index", int),
+    "Rola": ("role", str),
+    "Autopilot": ("autopilot_enabled", bool),
+}
+# Kolumny, których nie wolno wyczyścić (puste hasło blokuje logowanie, pusty klucz psuje rzutowanie)
+REQUIRED_COLUMNS = ("Hasło", "Klucz", "Rola")
+
+
+def _cell(value, cast=str):
+    """Wartość komórki po rzutowaniu; wyczyszczona komórka (None/NaN) -> "" / None / False."""
+    if pd.isna(value):
+        return {str: "", bool: False}.get(cast)
+    return cast(value)
+
+
+def prompt_name_for(cfg, prompt_urls):
+    """Nazwa promptu operatora — po URL (jak w edytorze), w ostateczności zapisana nazwa."""
+    url = cfg.get("prompt_url", "")
+    for name, prompt_url in prompt_urls.items():
+        if prompt_url == url:
+            return name
+    return cfg.get("prompt_name", "")
+
+
+def configs_frame(configs, operators, prompt_urls):
+    rows = []
+    for op in operators:
+        cfg = configs.get(op, {})
+        rows.append({
+            "Operator": op,
+            "Hasło": cfg.get("password", ""),
+            "Klucz": int(cfg.get("assigned_key_index", 0)),
+            "Prompt": prompt_name_for(cfg, prompt_urls),
+            "Rola": cfg.get("role", DEFAULT_ROLE),
+            "Autopilot": bool(cfg.get("autopilot_enabled", False)),
+            "Wiadomość": cfg.get("admin_message", ""),
+        })
+    return pd.DataFrame(rows)
+
+
+def diff_configs(before, after, prompt_urls):
+    """({operator: zmienione pola}, [błędy]) — tylko operatorzy, których wiersz się zmienił.
+
+    Wiersz z wyczyszczonym polem wymaganym nie trafia do zmian, tylko do błędów.
+    """
+    if list(after["Operator"]) != list(before["Operator"]):
+        return {}, ["Tabela nie zgadza się z migawką — wczytaj ponownie."]
+    before = before.set_index("Operator")
+    updates, errors = {}, []
+    for row in after.to_dict("records"):
+        op = row["Operator"]
+        old = before.loc[op]
+        changes = {}
+        for col, (field, cast) in GRID_FIELDS.items():
+            value = _cell(row[col], cast)
+            if value != _cell(old[col], cast):
+                changes[field] = value
+        empty = [col for col in REQUIRED_COLUMNS if GRID_FIELDS[col][0] in changes
+                 and changes[GRID_FIELDS[col][0]] in ("", None)]
+        if empty:
+            errors.append(f"{op}: pole {', '.join(empty)} nie może być puste")
+            continue
+        prompt = _cell(row["Prompt"])
+        if prompt != _cell(old["Prompt"]) and prompt in prompt_urls:
+            changes.update(prompt_name=prompt, prompt_url=prompt_urls[prompt])
+        message = _cell(row["Wiadomość"])
+        if message != _cell(old["Wiadomość"]):
+            # Nowa wiadomość = znowu nieodczytana (jak w edytorze pojedynczym)
+            changes.update(admin_message=message, message_read=False)
+        if changes:
+            updates[op] = changes
+    return updates, errors
+
+
+def commit_configs(db, updates):
+    """Zapisuje zmiany (set merge) w WriteBatchach po BATCH_LIMIT dokumentów, razem z licznikami
+    operatorów w config_version. Zwraca liczbę batchy."""
+    ops = list(updates)
+    commit_in_batches(
+        db, ((db.collection(CONFIGS_COLLECTION).document(op),
+              {**updates[op], "updated_at": firestore.SERVER_TIMESTAMP}) for op in ops),
+        on_batch=lambda batch, refs: bump_versions(db, operators=[r.id for r in refs], batch=batch))
+    return (len(ops) + BATCH_LIMIT - 1) // BATCH_LIMIT
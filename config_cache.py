@@ -0,0 +1,168 @@
+"""Cache dokumentów `admin_config` (global_settings, custom_prompts) wspólny dla procesu.
+
+Panel admina i aplikacje operatorów czytają te dokumenty przy każdym przebiegu
+skryptu — tutaj kopia trzymana jest w pamięci procesu przez TTL_SECONDS. Zapis
+przez write_config() jest write-through: idzie do Firestore i od razu unieważnia
+lokalną kopię, więc panel, który zapisał, nie widzi starych danych.
+
+Każdy zapis podbija w dokumencie licznik `version` (Increment). Po upływie TTL
+cache nie pobiera całego dokumentu, tylko samo pole `version` (maska pól) — jeśli
+się nie zmieniło, dotychczasowa kopia zostaje na kolejny TTL. Maska zmniejsza
+transfer, nie koszt: sprawdzenie to nadal 1 rozliczany odczyt, dlatego TTL jest
+dłuższy (własne zapisy panelu i tak widać od razu dzięki write-through).
+
+Dodatkowo każdy zapis konfiguracji (dokumenty admin_config i operator_configs)
+podbija w tym samym WriteBatch licznik w jednym małym dokumencie
+admin_config/config_version: {version, <nazwa dokumentu>: n, operators: {op: n}}.
+Aplikacje operatorów czytają przy każdym przebiegu tylko ten dokument
+(sync_config) i pobierają ponownie wyłącznie to, czego licznik się zmienił.
+
+Zapisy z pominięciem tego modułu (konsola Firestore, stare strony prev*_admin_app)
+nie podbijają liczników, więc niezależnie od nich każda kopia jest pobierana
+ponownie najpóźniej po MAX_AGE_SECONDS.
+"""
+import copy
+import threading
+import time
+
+from firebase_admin import firestore
+
+CONFIG_COLLECTION = "admin_config"
+GLOBAL_SETTINGS = "global_settings"
+CUSTOM_PROMPTS = "custom_prompts"
+VERSION_FIELD = "version"
+UPDATED_FIELD = "updated_at"
+TTL_SECONDS = 120
+# Górna granica wieku kopii, nawet gdy liczniki wersji się nie zmieniły
+MAX_AGE_SECONDS = 5 * TTL_SECONDS
+VERSIONS_DOC = "config_version"
+OPERATOR_CONFIGS = "operator_configs"
+
+# Wartości przyjmowane, gdy dokumentu (lub pola) jeszcze nie ma
+DEFAULTS = {
+    GLOBAL_SETTINGS: {"show_diamonds": True},
+    CUSTOM_PROMPTS: {"urls": {}},
+}
+
+
+class ConfigCache:
+    def __init__(self, ttl=TTL_SECONDS):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.max_age = MAX_AGE_SECONDS
+        self.entries = {}   # nazwa dokumentu -> [dane, czas sprawdzenia, czas pobrania]
+        self.operators = {}  # operator -> (licznik z config_version, dane operator_configs, czas pobrania)
+        self.seen = {}      # nazwa dokumentu -> licznik z config_version przy ostatnim sync()
+
+    def get(self, db, name):
+        """Dane dokumentu `name` (kopia — można ją modyfikować)."""
+        ref = db.collection(CONFIG_COLLECTION).document(name)
+        with self.lock:
+            entry = self.entries.get(name)
+        if entry is not None and time.monotonic() - entry[2] >= self.max_age:
+            entry = None
+        if entry is not None and time.monotonic() - entry[1] >= self.ttl:
+            # TTL minął: odczyt samego licznika wersji — 1 odczyt jak całość, ale bez przesyłania danych
+            # (dokumenty bez wersji — od razu całość)
+            if VERSION_FIELD in entry[0] and \
+                    (ref.get(field_paths=[VERSION_FIELD]).to_dict() or {}).get(VERSION_FIELD) == entry[0][VERSION_FIELD]:
+                entry[1] = time.monotonic()
+            else:
+                entry = None
+        if entry is None:
+            data = {**DEFAULTS.get(name, {}), **(ref.get().to_dict() or {})}
+            entry = [data, time.monotonic(), time.monotonic()]
+            with self.lock:
+                self.entries[name] = entry
+        return copy.deepcopy(entry[0])
+
+    def version(self, name):
+        """Wersja lokalnej kopii (0 = brak kopii albo dokument sprzed wersjonowania)."""
+        with self.lock:
+            entry = self.entries.get(name)
+        return entry[0].get(VERSION_FIELD, 0) if entry else 0
+
+    def write(self, db, name, data, merge=True):
+        """Zapis write-through: dane + podbite wersje (dokument i config_version), lokalna kopia unieważniona."""
+        batch = db.batch()
+        batch.set(db.collection(CONFIG_COLLECTION).document(name),
+                  {**data, VERSION_FIELD: firestore.Increment(1), UPDATED_FIELD: firestore.SERVER_TIMESTAMP},
+                  merge=merge)
+        bump_versions(db, names=[name], batch=batch)
+        batch.commit()
+        self.invalidate(name)
+
+    def sync(self, db):
+        """Jeden odczyt config_version: zmienione (i starsze niż max_age) dokumenty unieważnione,
+        pozostałe ważne na kolejny TTL."""
+        versions = db.collection(CONFIG_COLLECTION).document(VERSIONS_DOC).get().to_dict() or {}
+        now = time.monotonic()
+        with self.lock:
+            for name, entry in list(self.entries.items()):
+                if self.seen.get(name, 0) != versions.get(name, 0) or now - entry[2] >= self.max_age:
+                    del self.entries[name]
+                else:
+                    entry[1] = now
+            self.seen = {name: versions.get(name, 0) for name in set(self.seen) | set(self.entries) | set(DEFAULTS)}
+        return versions
+
+    def operator_config(self, db, op, versions):
+        """operator_configs/{op} — pobierany ponownie po zmianie licznika operatora w config_version
+        albo po max_age."""
+        version = versions.get("operators", {}).get(op, 0)
+        with self.lock:
+            cached = self.operators.get(op)
+        if cached is None or cached[0] != version or time.monotonic() - cached[2] >= self.max_age:
+            cached = (version, db.collection(OPERATOR_CONFIGS).document(op).get().to_dict() or {}, time.monotonic())
+            with self.lock:
+                self.operators[op] = cached
+        return copy.deepcopy(cached[1])
+
+    def invalidate(self, name=None):
+        with self.lock:
+            if name is None:
+                self.entries.clear()
+                self.operators.clear()
+            else:
+                self.entries.pop(name, None)
+
+
+_cache = ConfigCache()
+
+
+def get_config(db, name):
+    return _cache.get(db, name)
+
+
+def write_config(db, name, data, merge=True):
+    _cache.write(db, name, data, merge=merge)
+
+
+def invalidate_config(name=None):
+    _cache.invalidate(name)
+
+
+def config_version(name):
+    return _cache.version(name)
+
+
+def sync_config(db):
+    """Wersje konfiguracji (jeden odczyt) — wywołać raz na przebieg przed get_config/get_operator_config."""
+    return _cache.sync(db)
+
+
+def get_operator_config(db, op, versions):
+    return _cache.operator_config(db, op, versions)
+
+
+def bump_versions(db, names=(), operators=(), batch=None):
+    """Podbija liczniki w config_version — w podanym WriteBatch (razem z samym zapisem) albo osobno."""
+    data = {VERSION_FIELD: firestore.Increment(1), UPDATED_FIELD: firestore.SERVER_TIMESTAMP}
+    data.update({name: firestore.Increment(1) for name in names})
+    if operators:
+        data["operators"] = {op: firestore.Increment(1) for op in operators}
+    ref = db.collection(CONFIG_COLLECTION).document(VERSIONS_DOC)
+    if batch is not None:
+        batch.set(ref, data, merge=True)
+    else:
+        ref.set(data, merge=True)
@@ -0,0 +1,218 @@
+"""Licznik kosztu Firestore dla panelu admina.
+
+MeteredClient opakowuje klienta Firestore i wszystko, co z niego wychodzi
+(kolekcje, dokumenty, zapytania, agregacje, batche), licząc odczyty dokumentów,
+zapisy, liczbę RPC i czas — osobno dla każdej zakładki (zakresu) w bieżącym
+przebiegu skryptu. Każdy licznik trafia też od razu do CostLog (sumy dzienne dla
+całego procesu), więc przebieg przerwany przez st.rerun() też jest policzony.
+
+Odczyty liczone tak jak rozlicza je Firestore: 1 na zwrócony dokument, min. 1 na
+zapytanie, 1 na zapytanie agregujące (do 1000 dopasowanych). Czas to czas wykonania
+bloku zakładki (track), nie samych RPC. Listenery on_snapshot (tryb LIVE) nie są
+liczone — działają w tle, poza przebiegiem skryptu.
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+COUNTERS = ("reads", "writes", "rpcs", "seconds")
+UNSCOPED = "(poza zakładką)"
+
+# Metody zwracające kolejny obiekt do opakowania (zapytania budowane łańcuchowo)
+_CHAIN = {"collection", "document", "collection_group", "where", "select", "order_by", "limit",
+          "limit_to_last", "offset", "start_at", "start_after", "end_at", "end_before",
+          "count", "sum", "avg", "batch"}
+_WRITES = {"set", "update", "delete", "create"}
+
+
+def _raw(obj):
+    return obj._target if isinstance(obj, _Metered) else obj
+
+
+def _add_row(rows, scope, deltas):
+    row = rows.setdefault(scope, dict.fromkeys(COUNTERS + ("runs",), 0))
+    for k, v in deltas.items():
+        row[k] += v
+
+
+class CostLog:
+    """Sumy dzienne kosztu (na proces): {dzień: {zakres: liczniki + liczba przebiegów}}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.days = {}
+
+    def add(self, day, scope, **deltas):
+        with self.lock:
+            _add_row(self.days.setdefault(day, {}), scope, deltas)
+
+    def day(self, day):
+        with self.lock:
+            return {scope: dict(row) for scope, row in self.days.get(day, {}).items()}
+
+
+class CostMeter:
+    """Liczniki przebiegu skryptu per zakres (zakładka); new_run() zeruje je na starcie przebiegu."""
+
+    def __init__(self, log=None, day=None, own_run=None):
+        self.lock = threading.Lock()
+        self.log = log
+        self.day = day
+        # own_run() == True: wywołanie to osobny przebieg (np. rerun samego fragmentu)
+        self.own_run = own_run
+        self.scope = UNSCOPED
+        self.scopes = {}
+        self.counted = set()   # zakresy z policzonym przebiegiem w bieżącym przebiegu skryptu
+
+    def add(self, **deltas):
+        with self.lock:
+            _add_row(self.scopes, self.scope, deltas)
+        if self.log is not None:
+            self.log.add(self.day, self.scope, **deltas)
+
+    @contextmanager
+    def track(self, scope):
+        """Wszystko w bloku liczone jest do `scope`, razem z czasem wykonania bloku.
+
+        Przebieg liczony raz na zakres w przebiegu skryptu (kilka fragmentów jednej zakładki
+        to jeden przebieg); wywołanie, dla którego own_run() zwraca True, to osobny przebieg.
+        """
+        prev, self.scope = self.scope, scope
+        with self.lock:
+            new_run = scope not in self.counted or (self.own_run is not None and self.own_run())
+            self.counted.add(scope)
+        if new_run:
+            self.add(runs=1)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add(seconds=time.perf_counter() - start)
+            self.scope = prev
+
+    def new_run(self, day):
+        """Początek nowego przebiegu całego skryptu: zerowanie liczników zakresów."""
+        with self.lock:
+            self.scopes = {}
+            self.counted = set()
+            self.scope = UNSCOPED
+            self.day = day
+
+
+def tracked(get_meter, scope):
+    """Dekorator track() dla funkcji (np. fragmentów st.fragment, które mają własne przebiegi).
+
+    Licznik pobierany przy każdym wywołaniu (get_meter()), bo fragment przeżywa przebieg,
+    który go zdefiniował. `scope` może być funkcją — nazwa zakresu liczona przy każdym wywołaniu.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_meter().track(scope() if callable(scope) else scope):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _Metered:
+    def __init__(self, target, meter):
+        self._target = target
+        self._meter = meter
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _CHAIN:
+            return self._chain(attr)
+        if name in _WRITES:
+            return self._write(attr)
+        return attr
+
+    def _chain(self, fn):
+        def call(*args, **kwargs):
+            return _wrap(fn(*args, **kwargs), self._meter)
+        return call
+
+    def _write(self, fn):
+        def call(*args, **kwargs):
+            self._meter.add(writes=1, rpcs=1)
+            return fn(*args, **kwargs)
+        return call
+
+    def _read_one(self, fn, *args, **kwargs):
+        self._meter.add(reads=1, rpcs=1)
+        return fn(*args, **kwargs)
+
+    def _stream(self, fn, *args, **kwargs):
+        n = 0
+        try:
+            for item in fn(*args, **kwargs):
+                n += 1
+                yield item
+        finally:
+            self._meter.add(reads=max(n, 1), rpcs=1)
+
+
+class _MeteredQuery(_Metered):
+    """Kolekcja lub zapytanie: stream/get liczą zwrócone dokumenty."""
+
+    def stream(self, *args, **kwargs):
+        return self._stream(self._target.stream, *args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+    def list_documents(self, *args, **kwargs):
+        return [_wrap(ref, self._meter) for ref in self._stream(self._target.list_documents, *args, **kwargs)]
+
+
+class _MeteredDocument(_Metered):
+    def get(self, *args, **kwargs):
+        return self._read_one(self._target.get, *args, **kwargs)
+
+
+class _MeteredAggregation(_Metered):
+    def get(self, *args, **kwargs):
+        return self._read_one(self._target.get, *args, **kwargs)
+
+
+class _MeteredBatch(_Metered):
+    """WriteBatch: operacje liczone przy commit (jeden RPC na cały batch)."""
+
+    def __init__(self, target, meter):
+        super().__init__(target, meter)
+        self._ops = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _WRITES:
+            def call(ref, *args, **kwargs):
+                self._ops += 1
+                return attr(_raw(ref), *args, **kwargs)
+            return call
+        return attr
+
+    def commit(self, *args, **kwargs):
+        self._meter.add(writes=self._ops, rpcs=1)
+        self._ops = 0
+        return self._target.commit(*args, **kwargs)
+
+
+class MeteredClient(_Metered):
+    """Klient Firestore z licznikiem kosztu; poza tym zachowuje się jak firestore.client()."""
+
+    def get_all(self, references, *args, **kwargs):
+        return self._stream(self._target.get_all, [_raw(r) for r in references], *args, **kwargs)
+
+
+def _wrap(obj, meter):
+    kind = type(obj).__name__
+    if "Aggregation" in kind:
+        return _MeteredAggregation(obj, meter)
+    if "Batch" in kind:
+        return _MeteredBatch(obj, meter)
+    if "Document" in kind:
+        return _MeteredDocument(obj, meter)
+    if "Collection" in kind or "Query" in kind:
+        return _MeteredQuery(obj, meter)
+    return obj
@@ -0,0 +1,92 @@
+"""Automatyczny przydział operatorów do projektów GCP (assigned_key_index).
+
+Obciążenie operatora to jego średni profil godzinowy sesji z ostatnich dni
+(`stats`, zamknięte dni z cache Parquet). Limity Vertex są minutowe, więc liczy
+się szczyt: obciążenie projektu = max po godzinach z sumy profili jego operatorów.
+Przydział zachłanny (LPT): operatorzy od największego szczytu, każdy do projektu,
+w którym wynikowy szczyt będzie najmniejszy (przy remisie zostaje obecny projekt).
+
+assigned_key_index = 0 oznacza losowanie projektu przy każdej sprawie (app_vertex).
+Takich operatorów propozycja nie zmienia — ich obciążenie liczone jest jako
+rozłożone równo na wszystkie projekty.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from stats_agg import add_to_agg, new_stats_agg
+from stats_cache import iter_operator_days_cached
+from stats_fetch import STATS_COLLECTION
+
+DEFAULT_DAYS = 14
+
+
+def history_dates(today_str, days=DEFAULT_DAYS):
+    """Ostatnie `days` zamkniętych dni (bez dzisiejszego, który jest niepełny)."""
+    today = datetime.strptime(today_str, "%Y-%m-%d")
+    return [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days, 0, -1)]
+
+
+def operator_profiles(db, operators, today_str, days=DEFAULT_DAYS):
+    """{operator: wektor 24 średnich sesji na godzinę} z ostatnich `days` dni."""
+    agg = new_stats_agg()
+    for coll, d_s, docs in iter_operator_days_cached(db, history_dates(today_str, days), today_str,
+                                                     collections=(STATS_COLLECTION,)):
+        for name, data in docs:
+            if name in operators:
+                add_to_agg(agg, coll, d_s, name, data)
+    hours = agg.frame()
+    hours = hours[hours["kind"] == "h"]
+    profiles = {op: np.zeros(24) for op in operators}
+    for (op, hour), value in hours.groupby(["operator", "hour"])["value"].sum().items():
+        profiles[op][hour] = value / days
+    return profiles
+
+
+def project_index(key, n_projects):
+    """Projekt (0..n_projects-1) jak w app_vertex: None dla losowania, numer spoza zakresu = ostatni projekt."""
+    return None if key <= 0 else min(key, n_projects) - 1
+
+
+def _loads(assignment, profiles, n_projects):
+    loads = np.zeros((n_projects, 24))
+    for op, key in assignment.items():
+        k = project_index(key, n_projects)
+        if k is None:
+            loads += np.asarray(profiles.get(op, 0)) / n_projects
+        else:
+            loads[k] += profiles.get(op, 0)
+    return loads
+
+
+def project_peaks(assignment, profiles, n_projects):
+    """Szczytowe obciążenie (sesje/h) każdego projektu przy danym przydziale (losowanie = po równo)."""
+    return _loads(assignment, profiles, n_projects).max(axis=1)
+
+
+def balance(profiles, n_projects, current=None):
+    """Zachłanny przydział {operator: numer projektu 1..n_projects} minimalizujący szczyt projektu.
+
+    Operatorzy z losowaniem (0 albo bez konfiguracji) nie dostają projektu — ich obciążenie
+    jest tłem rozłożonym po równo na wszystkie projekty.
+    """
+    current = current or {}
+    random_ops = {op: 0 for op in profiles if project_index(current.get(op, 0), n_projects) is None}
+    loads = _loads(random_ops, profiles, n_projects)
+    counts = [0] * n_projects
+    assignment = {}
+    locked = [op for op in profiles if op not in random_ops]
+    for op in sorted(locked, key=lambda o: (-profiles[o].max(), -profiles[o].sum(), o)):
+        if not profiles[op].any():
+            # Bez historii (nowi, nieaktywni): zostaje obecny projekt
+            best = project_index(current[op], n_projects)
+        else:
+            peaks = (loads + profiles[op]).max(axis=1)
+            # Remis: obecny projekt operatora (mniej zmian), potem mniej operatorów
+            best = min(range(n_projects),
+                       key=lambda k: (round(peaks[k], 6), k != project_index(current[op], n_projects), counts[k],
+                                      loads[k].sum()))
+        loads[best] += profiles[op]
+        counts[best] += 1
+        assignment[op] = best + 1
+    return assignment
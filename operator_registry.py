@@ -0,0 +1,112 @@
+"""Rejestr operatorów w Firestore (zamiast listy OPERATORS w kodzie).
+
+Źródłem prawdy jest kolekcja `operator_registry` (dokument na operatora: rola, aktywny).
+Nazwa nie może być `operators` — tak nazywają się podkolekcje dni statystyk, po których
+idą zapytania collection_group("operators") i wyjątek indeksu pola `date`.
+Do listowania służy indeks — jeden dokument admin_config/operator_index z mapą
+{nazwa: {role, active}} trzymany przez config_cache (TTL + wersja), więc panel
+dostaje całą listę jednym odczytem niezależnie od liczby operatorów (kilkaset
+wpisów to kilkadziesiąt KB). Indeks można odbudować z kolekcji (stronicowanie).
+"""
+from firebase_admin import firestore
+
+from config_cache import get_config, write_config
+from stats_fetch import commit_in_batches
+
+OPERATORS_COLLECTION = "operator_registry"
+OPERATOR_INDEX = "operator_index"
+ROLES = ["Operatorzy_DE", "Operatorzy_FR", "Operatorzy_UK/PL"]
+DEFAULT_ROLE = ROLES[0]
+PAGE_SIZE = 200
+
+# Lista startowa (dawne OPERATORS z admin_app.py) — do jednorazowego importu i gdy rejestr jest pusty
+DEFAULT_OPERATORS = ["Emilia", "Oliwia", "Iwona", "Marlena", "Magda", "Sylwia", "Ewelina", "Klaudia", "Marta",
+                     "EwelinaG", "Andrzej", "Romana", "Kasia"]
+
+
+def _entry(role, active=True):
+    return {"role": role or DEFAULT_ROLE, "active": bool(active)}
+
+
+def load_roster(db):
+    """Indeks rejestru {nazwa: {role, active}}, posortowany po nazwie; pusty, jeśli nikogo nie dodano."""
+    index = get_config(db, OPERATOR_INDEX).get("operators", {})
+    return dict(sorted(index.items(), key=lambda kv: kv[0].lower()))
+
+
+def operator_names(roster, active_only=True):
+    """Nazwy z rejestru; przy pustym rejestrze lista startowa."""
+    if not roster:
+        return list(DEFAULT_OPERATORS)
+    return [name for name, entry in roster.items() if entry.get("active", True) or not active_only]
+
+
+def search_roster(roster, query="", role=None, active_only=False):
+    """Filtr po fragmencie nazwy (bez wielkości liter) i roli — w pamięci, bez odczytów."""
+    query = query.strip().lower()
+    return {
+        name: entry for name, entry in roster.items()
+        if (not query or query in name.lower())
+        and (not role or entry.get("role") == role)
+        and (entry.get("active", True) or not active_only)
+    }
+
+
+def save_operator(db, name, role=DEFAULT_ROLE, active=True):
+    """Dodaje lub aktualizuje operatora: dokument w `operators` + wpis w indeksie."""
+    entry = _entry(role, active)
+    db.collection(OPERATORS_COLLECTION).document(name).set(
+        {**entry, "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    write_config(db, OPERATOR_INDEX, {"operators": {name: entry}})
+
+
+def save_roles(db, roles, roster):
+    """Role zmienione poza rejestrem (edytor konfiguracji) -> rejestr: jeden WriteBatch + jeden zapis indeksu."""
+    changed = {op: role for op, role in roles.items() if op in roster and roster[op].get("role") != role}
+    if not changed:
+        return
+    batch = db.batch()
+    for op, role in changed.items():
+        batch.set(db.collection(OPERATORS_COLLECTION).document(op),
+                  {"role": role, "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    batch.commit()
+    write_config(db, OPERATOR_INDEX,
+                 {"operators": {op: _entry(role, roster[op].get("active", True)) for op, role in changed.items()}})
+
+
+def iter_registry(db, page_size=PAGE_SIZE):
+    """Wszystkie dokumenty `operators` stronami po `page_size` (po ID dokumentu)."""
+    query = db.collection(OPERATORS_COLLECTION).order_by("__name__").limit(page_size)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+def rebuild_index(db):
+    """Odbudowuje indeks z kolekcji `operators` (np. po ręcznej edycji w konsoli). Zwraca liczbę operatorów."""
+    index = {}
+    for snap in iter_registry(db):
+        data = snap.to_dict() or {}
+        index[snap.id] = _entry(data.get("role"), data.get("active", True))
+    # Wpisy bez dokumentu w kolekcji usuwane z indeksu (merge zachowuje licznik wersji)
+    stale = {name: firestore.DELETE_FIELD for name in load_roster(db) if name not in index}
+    write_config(db, OPERATOR_INDEX, {"operators": {**index, **stale}})
+    return len(index)
+
+
+def seed_operators(db, names, roles=None):
+    """Jednorazowy import listy (duplikaty pomijane) w WriteBatchach. Zwraca liczbę dodanych."""
+    roles = roles or {}
+    existing = load_roster(db)
+    new = [name for name in dict.fromkeys(names) if name not in existing]
+    if not new:
+        return 0
+    entries = {name: _entry(roles.get(name)) for name in new}
+    commit_in_batches(db, ((db.collection(OPERATORS_COLLECTION).document(name),
+                            {**entries[name], "updated_at": firestore.SERVER_TIMESTAMP}) for name in new))
+    write_config(db, OPERATOR_INDEX, {"operators": entries})
+    return len(new)
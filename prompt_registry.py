@@ -0,0 +1,209 @@
+"""Rejestr promptów adresowany treścią (SHA-256).
+
+Panel admina pobiera raz każdy zarejestrowany URL (PROMPT_URLS + custom_prompts),
+liczy hash, rozmiar i szacowaną liczbę tokenów i zapisuje:
+    prompt_blobs/{sha256}            treść (niezmienna — ten sam prompt pod kilkoma URL-ami = jeden dokument)
+    admin_config/prompt_index        {"urls": {url: {sha256, bytes, tokens, fetched_at}}} (przez config_cache)
+Aplikacje operatorów rozwiązują URL -> hash z indeksu i biorą treść z pamięci
+procesu, z lokalnego cache na dysku ({PROMPT_CACHE_DIR}/{sha256}.txt) albo jednym
+odczytem z prompt_blobs.
+
+URL-e wskazują gałąź `main`, więc treść może się zmienić. Sprawdza to tylko panel
+admina: refresh_stale() odpytuje GitHub (warunkowo, z ETagiem) o wpisy niesprawdzane
+od FALLBACK_TTL_SECONDS i zapisuje do rejestru tylko zmienione treści. Operatorzy
+nigdy nie pytają GitHuba o zarejestrowany URL — dzięki temu treść zawsze ma hash
+z indeksu (zgodny z rozgrzanym cache Vertex). GitHub (z tym samym TTL na proces)
+obsługuje tylko URL-e spoza rejestru.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from config_cache import get_config, write_config
+
+BLOBS_COLLECTION = "prompt_blobs"
+PROMPT_INDEX = "prompt_index"
+CACHE_DIR = os.environ.get(
+    "PROMPT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".prompt_cache")
+)
+# Szacunek tokenów bez tokenizera: ~4 znaki na token
+CHARS_PER_TOKEN = 4
+# Dokument Firestore ma limit 1 MiB — większe prompty zostają tylko pod URL-em
+MAX_BLOB_BYTES = 900_000
+FETCH_TIMEOUT = 20
+# Co tyle sekund panel admina sprawdza zarejestrowane URL-e, a operatorzy URL-e spoza rejestru
+FALLBACK_TTL_SECONDS = 3600
+
+# Prompt zapisany na stałe w app_vertex (nie w konfiguracji operatorów) — rejestrowany razem z resztą
+VERTEX_PROMPT_URL = "https://raw.githubusercontent.com/szturchaczysko-cpu/szturchacz/refs/heads/main/prompt4622.txt"
+APP_PROMPT_URLS = {"app_vertex (na stałe w kodzie)": VERTEX_PROMPT_URL}
+
+_memory = {}     # sha256 -> treść (niezmienna, więc bez TTL)
+_fallback = {}   # url -> (sha256, czas sprawdzenia na GitHubie, ETag) — URL-e spoza rejestru
+_checked = {}    # url -> czas ostatniego sprawdzenia rejestru na GitHubie (panel admina)
+_memory_lock = threading.Lock()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _local_path(sha):
+    return os.path.join(CACHE_DIR, f"{sha}.txt")
+
+
+def _remember(sha, text):
+    with _memory_lock:
+        _memory[sha] = text
+    path = _local_path(sha)
+    if not os.path.exists(path):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def _local_text(sha):
+    with _memory_lock:
+        text = _memory.get(sha)
+    if text is None and os.path.exists(_local_path(sha)):
+        try:
+            with open(_local_path(sha), encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        if content_hash(text) != sha:   # uszkodzony plik — pobierz ponownie
+            return None
+        with _memory_lock:
+            _memory[sha] = text
+    return text
+
+
+def fetch_url(url, etag=None):
+    """(treść, ETag); z `etag` zapytanie warunkowe — przy niezmienionej treści (304) treść to None."""
+    response = requests.get(url, timeout=FETCH_TIMEOUT, headers={"If-None-Match": etag} if etag else None)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.text, response.headers.get("ETag")
+
+
+def refresh_registry(db, urls, force=False):
+    """Pobiera każdy URL raz (równolegle) i aktualizuje rejestr.
+
+    Bez `force` zarejestrowane URL-e są pobierane warunkowo (ETag z indeksu) — niezmieniona
+    treść nie jest ani pobierana, ani zapisywana. Zwraca {url: wpis indeksu albo {"error": ...}}.
+    Nowe treści trafiają do prompt_blobs, istniejące hashe nie są zapisywane ponownie.
+    """
+    urls = list(dict.fromkeys(urls))
+    known = {} if force else load_index(db)
+    etags = [known.get(url, {}).get("etag") for url in urls]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        fetched = dict(zip(urls, pool.map(_try_fetch, urls, etags)))
+
+    texts = {}
+    index, result = {}, {}
+    for url, (text, etag, error) in fetched.items():
+        _checked[url] = time.monotonic()   # także po błędzie — następna próba po FALLBACK_TTL_SECONDS
+        if error is not None:
+            result[url] = {"error": error}
+            continue
+        if text is None:   # 304 — wpis rejestru aktualny
+            result[url] = known[url]
+            continue
+        sha = content_hash(text)
+        texts[sha] = text
+        index[url] = {"sha256": sha, "bytes": len(text.encode("utf-8")), "tokens": len(text) // CHARS_PER_TOKEN,
+                      "etag": etag, "fetched_at": datetime.now(timezone.utc)}
+        result[url] = index[url]
+
+    refs = [db.collection(BLOBS_COLLECTION).document(sha) for sha in texts]
+    existing = {snap.id for snap in db.get_all(refs, field_paths=["bytes"]) if snap.exists} if refs else set()
+    new = [sha for sha in texts if sha not in existing and len(texts[sha].encode("utf-8")) <= MAX_BLOB_BYTES]
+    if new:
+        batch = db.batch()
+        for sha in new:
+            batch.set(db.collection(BLOBS_COLLECTION).document(sha),
+                      {"content": texts[sha], "bytes": len(texts[sha].encode("utf-8"))})
+        batch.commit()
+    for sha, text in texts.items():
+        _remember(sha, text)
+    if index:
+        write_config(db, PROMPT_INDEX, {"urls": index})
+    return result
+
+
+def refresh_stale(db, urls):
+    """Okresowe odświeżenie rejestru po stronie admina: URL-e niesprawdzane w tym procesie
+    od FALLBACK_TTL_SECONDS. Zwraca wynik refresh_registry ({} gdy nic do sprawdzenia)."""
+    now = time.monotonic()
+    stale = [url for url in dict.fromkeys(urls) if url not in _checked or now - _checked[url] >= FALLBACK_TTL_SECONDS]
+    return refresh_registry(db, stale) if stale else {}
+
+
+def _try_fetch(url, etag=None):
+    try:
+        return (*fetch_url(url, etag=etag), None)
+    except Exception as e:
+        return None, None, str(e)
+
+
+def load_index(db):
+    return get_config(db, PROMPT_INDEX).get("urls", {})
+
+
+def _registered_text(db, sha):
+    """Treść zarejestrowanego hasha: pamięć / dysk / jeden odczyt z prompt_blobs (None, gdy brak)."""
+    text = _local_text(sha)
+    if text is not None:
+        return text
+    snap = db.collection(BLOBS_COLLECTION).document(sha).get()
+    text = (snap.to_dict() or {}).get("content") if snap.exists else None
+    if text is None or content_hash(text) != sha:
+        return None
+    _remember(sha, text)
+    return text
+
+
+def resolve_prompt(db, url):
+    """Treść promptu spod `url` z rejestru po hashu (rejestr odświeża panel admina).
+
+    Tylko URL spoza rejestru (albo bez treści w prompt_blobs) jest pobierany z GitHuba —
+    najwyżej raz na FALLBACK_TTL_SECONDS na proces, warunkowo z ETagiem.
+    """
+    entry = load_index(db).get(url)
+    if entry:
+        text = _registered_text(db, entry["sha256"])
+        if text is not None:
+            return text
+
+    with _memory_lock:
+        checked = _fallback.get(url)
+    known = _local_text(checked[0]) if checked else None
+    if known is not None and time.monotonic() - checked[1] < FALLBACK_TTL_SECONDS:
+        return known
+    try:
+        text, etag = fetch_url(url, etag=checked[2] if known is not None else None)
+    except Exception:
+        if known is None:
+            raise
+        return known   # GitHub niedostępny — zostaje ostatnio pobrana wersja
+    if text is None:
+        sha, text = checked[0], known
+    else:
+        sha = content_hash(text)
+        _remember(sha, text)
+    with _memory_lock:
+        _fallback[url] = (sha, time.monotonic(), etag)
+    return text
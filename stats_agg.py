@@ -0,0 +1,162 @@
+"""Wektorowa agregacja dokumentów operatorów (stats / ew_operator_stats / rollupy).
+
+Dokumenty są zbierane w akumulatorze i raz zamieniane na ramkę w formacie długim:
+    date | operator | kind | transition | hour | value
+    kind: "s" sesje, "h" sesje w godzinie `hour`, "t" przejście PZ `transition`, "ew" casy EW
+Sumy, ranking, przejścia, rozkład godzinowy i serie dzienne liczy `summarize`
+przez groupby/bincount. Odjęcie dokumentu (odświeżanie przyrostowe, LIVE) to
+dopisanie jego wierszy ze znakiem minus.
+"""
+import numpy as np
+import pandas as pd
+
+from stats_fetch import DIAMOND_SUFFIX, EW_COLLECTION
+
+COLUMNS = ["date", "operator", "kind", "transition", "hour", "value"]
+
+
+def _empty_frame():
+    return pd.DataFrame({
+        "date": pd.Series(dtype=object), "operator": pd.Series(dtype=object),
+        "kind": pd.Series(dtype=object), "transition": pd.Series(dtype=object),
+        "hour": pd.Series(dtype=np.int64), "value": pd.Series(dtype=np.int64),
+    })
+
+
+def _frame(date, operator, kind, transition, hour, value):
+    return pd.DataFrame({"date": date, "operator": operator, "kind": kind,
+                         "transition": transition, "hour": hour, "value": value}, columns=COLUMNS)
+
+
+def docs_frame(records):
+    """[(kolekcja, data, operator, dane, znak)] -> ramka w formacie długim."""
+    if not records:
+        return _empty_frame()
+    stats = [r for r in records if r[0] != EW_COLLECTION]
+    ew = [r for r in records if r[0] == EW_COLLECTION]
+    parts = []
+
+    if ew:
+        parts.append(_frame([r[1] for r in ew], [r[2] for r in ew], "ew", "", -1,
+                            [r[4] * r[3].get("cases_completed", 0) for r in ew]))
+    if stats:
+        dates = [r[1] for r in stats]
+        names = [r[2] for r in stats]
+        signs = np.array([r[4] for r in stats], dtype=np.int64)
+        parts.append(_frame(dates, names, "s", "", -1,
+                            signs * np.array([r[3].get("sessions_completed", 0) for r in stats], dtype=np.int64)))
+
+        # Godziny z "HH:MM" — jedno explode i jedno cięcie stringów dla wszystkich dokumentów
+        times = pd.DataFrame({"date": dates, "operator": names, "sign": signs,
+                              "t": [r[3].get("session_times", []) for r in stats]}).explode("t").dropna(subset=["t"])
+        if not times.empty:
+            times["hour"] = pd.to_numeric(times["t"].str.slice(0, 2), errors="coerce")
+            times = times[times["hour"].between(0, 23)]
+            hourly = times.groupby(["date", "operator", "hour"], dropna=False, sort=False)["sign"].sum().reset_index()
+            parts.append(_frame(hourly["date"], hourly["operator"], "h", "", hourly["hour"].astype(np.int64),
+                                hourly["sign"]))
+
+        # Gotowe liczniki godzinowe (rollupy) i przejścia PZ — spłaszczone raz
+        hour_items = [(d, n, h, s * v) for (_, d, n, data, s) in stats
+                      for h, v in (data.get("session_hours") or {}).items()]
+        if hour_items:
+            hh = pd.DataFrame(hour_items, columns=["date", "operator", "hour", "value"])
+            hh["hour"] = pd.to_numeric(hh["hour"], errors="coerce")
+            hh = hh[hh["hour"].between(0, 23)]
+            parts.append(_frame(hh["date"], hh["operator"], "h", "", hh["hour"].astype(np.int64), hh["value"]))
+        tr_items = [(d, n, k, s * v) for (_, d, n, data, s) in stats
+                    if isinstance(data.get("pz_transitions"), dict)
+                    for k, v in data["pz_transitions"].items()]
+        if tr_items:
+            tr = pd.DataFrame(tr_items, columns=["date", "operator", "transition", "value"])
+            parts.append(_frame(tr["date"], tr["operator"], "t", tr["transition"], -1, tr["value"]))
+
+    frame = pd.concat(parts, ignore_index=True)
+    frame["hour"] = frame["hour"].astype(np.int64)
+    frame["value"] = frame["value"].astype(np.int64)
+    return frame
+
+
+class StatsAccumulator:
+    """Zbiera dokumenty i buduje z nich ramkę dopiero przy odczycie (frame())."""
+
+    def __init__(self):
+        self.records = []
+        self._frame = _empty_frame()
+        self._has_negative = False
+
+    def add(self, coll, d_s, name, data, sign=1):
+        self.records.append((coll, d_s, name, data, sign))
+        if sign < 0:
+            self._has_negative = True
+
+    def frame(self):
+        if self.records:
+            new = docs_frame(self.records)
+            self._frame = new if self._frame.empty else pd.concat([self._frame, new], ignore_index=True)
+            self.records = []
+        if self._has_negative:
+            # Sklejenie par -stare/+nowe, żeby ramka nie rosła przy każdym odświeżeniu
+            self._frame = (self._frame.groupby(COLUMNS[:-1], dropna=False, sort=False)["value"]
+                           .sum().reset_index())
+            self._has_negative = False
+        return self._frame
+
+
+def new_stats_agg():
+    return StatsAccumulator()
+
+
+def add_to_agg(agg, coll, d_s, name, data, sign=1):
+    """Dolicza dokument operatora do agregatu; sign=-1 odejmuje go (odświeżanie przyrostowe)."""
+    agg.add(coll, d_s, name, data, sign)
+
+
+def summarize(frame, selected_op="Wszyscy", dates=None):
+    """Sumy, ranking, przejścia, rozkład godzinowy i serie dzienne z ramki w formacie długim."""
+    if dates is not None:
+        frame = frame[frame["date"].isin(list(dates))]
+    if selected_op != "Wszyscy":
+        frame = frame[frame["operator"] == selected_op]
+
+    kind = frame["kind"]
+    sessions = frame[kind == "s"]
+    hours = frame[kind == "h"]
+    transitions = frame[kind == "t"]
+    ew = frame[kind == "ew"]
+
+    # Diamenty = przejścia *_to_PZ6; decyzja zapada raz na unikalny klucz, nie na wiersz
+    keys = transitions["transition"].unique()
+    diamonds = transitions[transitions["transition"].isin([k for k in keys if k.endswith(DIAMOND_SUFFIX)])]
+
+    ranking = pd.DataFrame({
+        "Sesje": sessions.groupby("operator")["value"].sum(),
+        "💎": diamonds.groupby("operator")["value"].sum(),
+        "🏢 EW": ew.groupby("operator")["value"].sum(),
+    }).fillna(0).astype(np.int64)
+    ranking.index.name = "Operator"
+
+    tr_sum = transitions.groupby("transition")["value"].sum()
+    tr_sum.index = tr_sum.index.str.replace("_to_", " ➡ ", regex=False)
+    tr_sum.index.name = "Przejście"
+
+    hourly = np.bincount(hours["hour"].to_numpy(dtype=np.int64), weights=hours["value"].to_numpy(dtype=np.float64),
+                         minlength=24)[:24]
+
+    per_day = pd.DataFrame({
+        "Sesje": sessions.groupby("date")["value"].sum(),
+        "💎": diamonds.groupby("date")["value"].sum(),
+        "🏢 EW": ew.groupby("date")["value"].sum(),
+    }).fillna(0).astype(np.int64).sort_index()
+    per_day.index.name = "Data"
+
+    return {
+        "total_sessions": int(sessions["value"].sum()),
+        "total_diamonds": int(diamonds["value"].sum()),
+        "ew_total_cases": int(ew["value"].sum()),
+        "ranking": ranking,
+        "transitions": tr_sum.sort_values(ascending=False),
+        "hourly": hourly,
+        "per_day": per_day,
+        "session_dates": sorted(sessions["date"].dropna().unique()),
+    }
@@ -0,0 +1,142 @@
+"""Lokalny cache Parquet zamkniętych dni statystyk.
+
+Dni sprzed dzisiejszego nigdy się nie zmieniają, więc po pierwszym pobraniu
+trzymamy ich dokumenty operatorów na dysku:
+    {CACHE_DIR}/{kolekcja}/{YYYY-MM-DD}.parquet   (jeden wiersz = jeden operator)
+Dzisiejszy dzień i dni bez wpisu w cache zawsze idą do Firestore.
+"""
+import os
+import shutil
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from stats_fetch import DAY_COLLECTIONS, iter_operator_days, iter_operator_docs
+
+CACHE_DIR = os.environ.get(
+    "STATS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".stats_cache")
+)
+
+# Tylko pola, z których korzysta panel — reszta dokumentu nie trafia do cache
+_SCHEMA = pa.schema([
+    ("operator", pa.string()),
+    ("sessions_completed", pa.int64()),
+    ("session_times", pa.list_(pa.string())),
+    ("session_hours", pa.map_(pa.string(), pa.int64())),
+    ("pz_transitions", pa.map_(pa.string(), pa.int64())),
+    ("cases_completed", pa.int64()),
+])
+_MAP_FIELDS = ("session_hours", "pz_transitions")
+
+
+def _day_path(collection, date_str):
+    return os.path.join(CACHE_DIR, collection, f"{date_str}.parquet")
+
+
+def _to_row(name, data):
+    row = {"operator": name}
+    for field in _SCHEMA.names[1:]:
+        value = data.get(field)
+        if field in _MAP_FIELDS:
+            value = list(value.items()) if isinstance(value, dict) else None
+        row[field] = value
+    return row
+
+
+def _from_row(row):
+    name = row.pop("operator")
+    data = {}
+    for field, value in row.items():
+        if value is None:
+            continue
+        data[field] = dict(value) if field in _MAP_FIELDS else value
+    return name, data
+
+
+def read_day(collection, date_str):
+    """Zwraca [(operator, dane), ...] z cache albo None, gdy dnia nie ma w cache."""
+    path = _day_path(collection, date_str)
+    if not os.path.exists(path):
+        return None
+    try:
+        rows = pq.read_table(path).to_pylist()
+    except Exception:   # uszkodzony / niedopisany plik — traktuj jak brak w cache
+        return None
+    return [_from_row(row) for row in rows]
+
+
+def write_day(collection, date_str, docs):
+    path = _day_path(collection, date_str)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pylist([_to_row(name, data) for name, data in docs], schema=_SCHEMA)
+    # Unikalny plik tymczasowy — zapisują też równoległe wątki tego samego procesu
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pq.write_table(table, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def expire_day(date_str, collections=DAY_COLLECTIONS):
+    """Usuwa dzień z cache (następny odczyt pobierze go z Firestore). Zwraca liczbę usuniętych plików."""
+    removed = 0
+    for collection in collections:
+        path = _day_path(collection, date_str)
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def cached_dates(collection=DAY_COLLECTIONS[0]):
+    folder = os.path.join(CACHE_DIR, collection)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f[:-len(".parquet")] for f in os.listdir(folder) if f.endswith(".parquet"))
+
+
+def iter_operator_days_cached(db, dates, today_str, collections=DAY_COLLECTIONS, operator=None, masks=None):
+    """Jak iter_operator_days, ale zamknięte dni (< today_str) czyta z cache i do niego dopisuje.
+
+    Z `operator` brakujące dni pobierane są tylko dla niego (get_all, z maską `masks`)
+    i nie trafiają do cache. Do cache zawsze idą całe dokumenty.
+    """
+    missing = set()
+    served = set()
+    for date_str in dates:
+        for collection in collections:
+            docs = read_day(collection, date_str) if date_str < today_str else None
+            if docs is None:
+                missing.add(date_str)
+            else:
+                served.add((collection, date_str))
+                yield collection, date_str, docs
+    if not missing:
+        return
+    if operator is not None:
+        for collection, date_str, docs in iter_operator_docs(db, sorted(missing), operator, collections, masks=masks):
+            if (collection, date_str) not in served:
+                yield collection, date_str, docs
+        return
+    # Dzień pobieramy dla obu kolekcji naraz — brak w jednej zwykle oznacza brak w drugiej
+    for collection, date_str, docs in iter_operator_days(db, sorted(missing), collections):
+        if (collection, date_str) in served:
+            continue
+        if date_str < today_str:
+            write_day(collection, date_str, docs)
+        yield collection, date_str, docs
+
+
+def rebuild_cache(db, today_str, collections=DAY_COLLECTIONS):
+    """Czyści cache i pobiera od nowa całą historię zamkniętych dni. Zwraca liczbę dni."""
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    dates = set()
+    for collection in collections:
+        dates.update(ref.id for ref in db.collection(collection).list_documents() if ref.id < today_str)
+    for _ in iter_operator_days_cached(db, sorted(dates), today_str, collections):
+        pass
+    return len(dates)
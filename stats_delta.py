@@ -0,0 +1,56 @@
+"""Przyrostowe odświeżanie statystyk otwartych dni (zwykle tylko dzisiaj).
+
+Tracker pamięta dla każdego dokumentu operatora jego `update_time` i ostatnie dane.
+Przy kolejnym odświeżeniu zwraca tylko dokumenty, które się zmieniły, razem ze
+starą wersją — panel odejmuje stare wartości i dodaje nowe zamiast liczyć wszystko
+od zera. Dokumenty `stats` mają pole `updated_at` (SERVER_TIMESTAMP z log_stats),
+więc dla nich pytamy Firestore wyłącznie o zmienione dokumenty.
+
+Usunięty dokument zwracany jest jako zmiana z nowymi danymi None (panel tylko
+odejmuje starą wersję). Pełny stream dnia widzi braki od razu; zapytanie po
+`updated_at` ich nie widzi, więc po nim idzie tanie zapytanie count() (1 odczyt
+na 1000 dokumentów) i dopiero przy niezgodności liczby — lista samych nazw.
+"""
+from firebase_admin import firestore
+
+from stats_fetch import DAY_COLLECTIONS, STATS_COLLECTION, UPDATED_FIELD
+
+
+class DayDeltaTracker:
+    def __init__(self, dates, collections=DAY_COLLECTIONS):
+        self.dates = list(dates)
+        self.collections = collections
+        self.docs = {}   # (kolekcja, data, operator) -> (update_time, dane)
+        self.since = {}  # (kolekcja, data) -> najnowszy `updated_at` (czas serwera)
+
+    def poll(self, db):
+        """Zwraca zmiany od ostatniego wywołania: [(kolekcja, data, operator, stare | None, nowe | None)]."""
+        changes = []
+        for d_s in self.dates:
+            for coll in self.collections:
+                day = db.collection(coll).document(d_s).collection("operators")
+                since = self.since.get((coll, d_s))
+                filtered = coll == STATS_COLLECTION and since is not None
+                query = day.where(filter=firestore.FieldFilter(UPDATED_FIELD, ">", since)) if filtered else day
+                present = set()
+                for doc in query.stream():
+                    key = (coll, d_s, doc.id)
+                    present.add(doc.id)
+                    old = self.docs.get(key)
+                    if old and old[0] == doc.update_time:
+                        continue
+                    data = doc.to_dict() or {}
+                    self.docs[key] = (doc.update_time, data)
+                    changes.append((coll, d_s, doc.id, old[1] if old else None, data))
+                    stamp = data.get(UPDATED_FIELD)
+                    if coll == STATS_COLLECTION and stamp is not None:
+                        self.since[(coll, d_s)] = max(self.since.get((coll, d_s)) or stamp, stamp)
+                known = [key for key in self.docs if key[0] == coll and key[1] == d_s]
+                if filtered:
+                    if day.count(alias="n").get()[0][0].value == len(known):
+                        continue
+                    present = {doc.id for doc in day.select([]).stream()}
+                for key in known:
+                    if key[2] not in present:
+                        changes.append((coll, d_s, key[2], self.docs.pop(key)[1], None))
+        return changes
@@ -0,0 +1,278 @@
+"""Warstwa pobierania statystyk operatorów z Firestore (panel admina)."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+STATS_COLLECTION = "stats"
+EW_COLLECTION = "ew_operator_stats"
+DAY_COLLECTIONS = (STATS_COLLECTION, EW_COLLECTION)
+
+# Pole z datą dnia zapisywane w każdym dokumencie operatora (wymagane przez collection group).
+# Wymaga włączonego indeksu pojedynczego pola `date` w zakresie collection group "operators"
+# (Firestore -> Indexes -> Single field -> Add exemption).
+DATE_FIELD = "date"
+# Znacznik ostatniego zapisu (SERVER_TIMESTAMP) — pozwala pytać tylko o zmienione dokumenty
+UPDATED_FIELD = "updated_at"
+# Liczniki sesji per godzina {"HH": n} (zastępują listę "HH:MM" w `session_times`)
+HOURS_FIELD = "session_hours"
+LEGACY_TIMES_FIELD = "session_times"
+TRANSITIONS_FIELD = "pz_transitions"
+# Licznik przejść *_to_PZ6 w dokumencie dnia (do sumowania zapytaniem agregującym)
+DIAMONDS_FIELD = "diamonds"
+DIAMOND_SUFFIX = "_to_PZ6"
+ALL_TIME_RANGE = ("0000-00-00", "9999-12-31")
+
+# Maski pól (select) — ranking i przejścia potrzebują tylko liczników, EW tylko casów.
+# Pola godzinowe (w starych dokumentach rosnąca lista `session_times`) dochodzą tylko,
+# gdy widoczny jest wykres godzinowy.
+BASE_FIELDS = {
+    STATS_COLLECTION: ("sessions_completed", TRANSITIONS_FIELD),
+    EW_COLLECTION: ("cases_completed",),
+}
+HOURLY_FIELDS = (HOURS_FIELD, LEGACY_TIMES_FIELD)
+
+# Firestore przyjmuje max 500 operacji w jednym WriteBatch
+BATCH_LIMIT = 400
+
+# Limit równoległych streamów — klient Firestore jest thread-safe, ale nie ma sensu
+# otwierać setek połączeń naraz przy "All Time".
+MAX_WORKERS = 16
+
+# Ile referencji wysyłamy w jednym get_all (BatchGetDocuments)
+GET_ALL_CHUNK = 100
+
+
+def field_masks(hourly=True):
+    """Maska pól per kolekcja dla widżetów statystyk; hourly=False pomija pola godzinowe."""
+    masks = {coll: list(fields) for coll, fields in BASE_FIELDS.items()}
+    if hourly:
+        masks[STATS_COLLECTION] += HOURLY_FIELDS
+    return masks
+
+
+def _read_day(db, collection, date_str, fields=None):
+    query = db.collection(collection).document(date_str).collection("operators")
+    if fields is not None:
+        query = query.select(fields)
+    docs = query.stream()
+    return collection, date_str, [(doc.id, doc.to_dict() or {}) for doc in docs]
+
+
+def iter_operator_days(db, dates, collections=DAY_COLLECTIONS, max_workers=MAX_WORKERS, masks=None):
+    """Pobiera równolegle {kolekcja}/{data}/operators dla wszystkich dat.
+
+    Zwraca krotki (kolekcja, data, [(operator, dane), ...]) w kolejności ukończenia,
+    więc agregacja może iść na bieżąco, zanim dojdą pozostałe dni.
+    `masks` (z field_masks) ogranicza pobierane pola; None = całe dokumenty.
+    """
+    jobs = [(c, d) for d in dates for c in collections]
+    if not jobs:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+        futures = [pool.submit(_read_day, db, c, d, masks[c] if masks else None) for c, d in jobs]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+
+def iter_operator_docs(db, dates, operator, collections=DAY_COLLECTIONS, chunk=GET_ALL_CHUNK, masks=None):
+    """Dokumenty jednego operatora: {kolekcja}/{data}/operators/{operator} przez get_all.
+
+    Zamiast streamować wszystkich operatorów dla każdego dnia budujemy dokładne
+    referencje i pobieramy je paczkami po `chunk` (30 dni = 60 dokumentów w 1 RPC).
+    Zwraca krotki jak iter_operator_days — po jednej na (kolekcja, data), pusta lista
+    gdy operator nie ma dokumentu w danym dniu.
+    """
+    refs = [db.collection(c).document(d).collection("operators").document(operator)
+            for d in dates for c in collections]
+    # get_all przyjmuje jedną maskę — suma pól obu kolekcji
+    field_paths = sorted({f for c in collections for f in masks[c]}) if masks else None
+    for i in range(0, len(refs), chunk):
+        for snap in db.get_all(refs[i:i + chunk], field_paths=field_paths):
+            day_ref = snap.reference.parent.parent
+            docs = [(snap.id, snap.to_dict() or {})] if snap.exists else []
+            yield day_ref.parent.id, day_ref.id, docs
+
+
+def day_range(db, start, end, collection=EW_COLLECTION):
+    """Dni [start, end] jako lista dat; dla zakresu All Time — dni istniejące w `collection`."""
+    if start == ALL_TIME_RANGE[0]:
+        return sorted(ref.id for ref in db.collection(collection).list_documents() if start <= ref.id <= end)
+    first, last = datetime.strptime(start, "%Y-%m-%d"), datetime.strptime(end, "%Y-%m-%d")
+    return [(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((last - first).days + 1)]
+
+
+def iter_operator_group(db, start, end, collections=DAY_COLLECTIONS, masks=None):
+    """Jedno zapytanie collection_group("operators") po zakresie dat [start, end] dla `stats`.
+
+    Zewnętrzny zapis ew_operator_stats nie ustawia pola `date` (uzupełnia je tylko backfill),
+    więc EW idzie zwykłym odczytem per dzień — inaczej dni po ostatnim backfillu by wypadły.
+    global_stats/totals/operators nie ma pola `date`, więc filtr go pomija.
+    Zwraca krotki w tym samym formacie co iter_operator_days.
+    """
+    if STATS_COLLECTION in collections:
+        query = (db.collection_group("operators")
+                 .where(filter=firestore.FieldFilter(DATE_FIELD, ">=", start))
+                 .where(filter=firestore.FieldFilter(DATE_FIELD, "<=", end)))
+        if masks:
+            query = query.select(sorted({DATE_FIELD} | set(masks[STATS_COLLECTION])))
+        for doc in query.stream():
+            if doc.reference.parent.parent.parent.id != STATS_COLLECTION:
+                continue
+            data = doc.to_dict() or {}
+            yield STATS_COLLECTION, data.get(DATE_FIELD), [(doc.id, data)]
+    if EW_COLLECTION in collections:
+        yield from iter_operator_days(db, day_range(db, start, end), collections=(EW_COLLECTION,), masks=masks)
+
+
+def first_stats_date(db):
+    """Najwcześniejsza data w dokumentach operatorów (stats + EW) — jeden odczyt, None gdy brak danych."""
+    query = (db.collection_group("operators")
+             .where(filter=firestore.FieldFilter(DATE_FIELD, ">=", ALL_TIME_RANGE[0]))
+             .order_by(DATE_FIELD).limit(1).select([DATE_FIELD]))
+    for doc in query.stream():
+        return (doc.to_dict() or {}).get(DATE_FIELD)
+    return None
+
+
+def calendar_days(first_day, today_str):
+    """Dni kalendarzowe od first_day do today_str włącznie (min. 1) — mianownik średnich All Time."""
+    if not first_day:
+        return 1
+    first = datetime.strptime(first_day, "%Y-%m-%d")
+    return max((datetime.strptime(today_str, "%Y-%m-%d") - first).days + 1, 1)
+
+
+def _sum_day(db, collection, date_str, field):
+    agg = db.collection(collection).document(date_str).collection("operators").sum(field, alias="n")
+    return int(agg.get()[0][0].value or 0)
+
+
+def headline_metrics(db, start, end, today_str, base=None):
+    """Sumy do rzędu metryk z zapytań agregujących zamiast pobierania dokumentów.
+
+    - zamknięte dni `stats`: jedno zapytanie po collection group "operators" (wymaga
+      uzupełnionych pól `date` i `diamonds` — patrz Narzędzia danych),
+    - dziś: dokumenty dnia (select), bo zapisy sprzed wdrożenia nie mają `diamonds`,
+    - EW: suma per dzień — zewnętrzny zapis ew_operator_stats nie ustawia `date`.
+    `base` to sumy z rollupu All Time (dni do watermarku), doliczane do wyniku.
+    Firestore liczy 1 odczyt na 1000 dopasowanych dokumentów zamiast 1 na dokument.
+    """
+    totals = dict(base or {"sessions": 0, "diamonds": 0, "ew": 0})
+    closed_end = min(end, (datetime.strptime(today_str, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d"))
+    if start <= closed_end:
+        query = (db.collection_group("operators")
+                 .where(filter=firestore.FieldFilter(DATE_FIELD, ">=", start))
+                 .where(filter=firestore.FieldFilter(DATE_FIELD, "<=", closed_end)))
+        agg = query.sum("sessions_completed", alias="sessions").sum(DIAMONDS_FIELD, alias="diamonds")
+        for r in agg.get()[0]:
+            totals[r.alias] += int(r.value or 0)
+    if start <= today_str <= end:
+        _, _, docs = _read_day(db, STATS_COLLECTION, today_str, ["sessions_completed", TRANSITIONS_FIELD])
+        for _, data in docs:
+            totals["sessions"] += data.get("sessions_completed", 0)
+            totals["diamonds"] += sum(v for k, v in (data.get(TRANSITIONS_FIELD) or {}).items()
+                                      if k.endswith(DIAMOND_SUFFIX))
+    days = day_range(db, start, end)
+    if days:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(days))) as pool:
+            totals["ew"] += sum(pool.map(lambda d: _sum_day(db, EW_COLLECTION, d, "cases_completed"), days))
+    return {
+        "total_sessions": totals["sessions"],
+        "total_diamonds": totals["diamonds"],
+        "ew_total_cases": totals["ew"],
+    }
+
+
+def commit_in_batches(db, writes, update=False, on_batch=None):
+    """Zapisuje pary (ref, dane) w WriteBatchach po BATCH_LIMIT operacji.
+
+    Domyślnie set z merge, przy `update=True` — update. `on_batch(batch, refs)` może dołożyć
+    do każdego batcha własne zapisy (np. liczniki wersji). Zwraca liczbę zapisanych dokumentów.
+    """
+    batch, refs, written = db.batch(), [], 0
+    for ref, data in writes:
+        if update:
+            batch.update(ref, data)
+        else:
+            batch.set(ref, data, merge=True)
+        refs.append(ref)
+        if len(refs) >= BATCH_LIMIT:
+            if on_batch: on_batch(batch, refs)
+            batch.commit()
+            written += len(refs)
+            batch, refs = db.batch(), []
+    if refs:
+        if on_batch: on_batch(batch, refs)
+        batch.commit()
+        written += len(refs)
+    return written
+
+
+def backfill_diamonds_field(db, today_str):
+    """Uzupełnia licznik `diamonds` w zamkniętych dniach `stats` na podstawie pz_transitions.
+
+    Dzisiejszy dzień jest pomijany (trwają zapisy Increment). Zwraca liczbę poprawionych.
+    """
+    def writes():
+        for day_ref in db.collection(STATS_COLLECTION).list_documents():
+            if day_ref.id >= today_str:
+                continue
+            for doc in day_ref.collection("operators").select([TRANSITIONS_FIELD, DIAMONDS_FIELD]).stream():
+                data = doc.to_dict() or {}
+                diamonds = sum(v for k, v in (data.get(TRANSITIONS_FIELD) or {}).items()
+                               if k.endswith(DIAMOND_SUFFIX))
+                if data.get(DIAMONDS_FIELD) != diamonds:
+                    yield doc.reference, {DIAMONDS_FIELD: diamonds}
+    return commit_in_batches(db, writes())
+
+
+def backfill_date_field(db, collections=DAY_COLLECTIONS):
+    """Dopisuje pole `date` do historycznych dokumentów operatorów. Zwraca liczbę poprawionych."""
+    def writes():
+        for collection in collections:
+            for day_ref in db.collection(collection).list_documents():
+                for doc in day_ref.collection("operators").select([DATE_FIELD]).stream():
+                    if (doc.to_dict() or {}).get(DATE_FIELD) != day_ref.id:
+                        yield doc.reference, {DATE_FIELD: day_ref.id}
+    return commit_in_batches(db, writes())
+
+
+def _legacy_hours(times):
+    hours = {}
+    for t in times or []:
+        hour = str(t)[:2]
+        if hour.isdigit() and int(hour) < 24:
+            hours[hour] = hours.get(hour, 0) + 1
+    return hours
+
+
+def migrate_session_times(db):
+    """Zamienia `session_times` na liczniki `session_hours` i przenosi płaskie pola
+    "pz_transitions.X_to_Y" (stary zapis przez set z merge) do mapy `pz_transitions`.
+
+    Zwraca (liczba poprawionych dokumentów, posortowane daty zmienionych dni) — te dni
+    trzeba wygasić z cache Parquet i przeliczyć w rollupach (stara treść).
+    """
+    prefix = TRANSITIONS_FIELD + "."
+    dates = set()
+
+    def writes():
+        for day_ref in db.collection(STATS_COLLECTION).list_documents():
+            for doc in day_ref.collection("operators").stream():
+                data = doc.to_dict() or {}
+                flat = {k: v for k, v in data.items() if k.startswith(prefix)}
+                if LEGACY_TIMES_FIELD not in data and not flat:
+                    continue
+                upd = {}
+                if LEGACY_TIMES_FIELD in data:
+                    for hour, n in _legacy_hours(data[LEGACY_TIMES_FIELD]).items():
+                        upd[f"{HOURS_FIELD}.{hour}"] = firestore.Increment(n)
+                    upd[LEGACY_TIMES_FIELD] = firestore.DELETE_FIELD
+                for key, n in flat.items():
+                    upd[f"{TRANSITIONS_FIELD}.{key[len(prefix):]}"] = firestore.Increment(n)
+                    upd[FieldPath(key).to_api_repr()] = firestore.DELETE_FIELD
+                dates.add(day_ref.id)
+                yield doc.reference, upd
+    fixed = commit_in_batches(db, writes(), update=True)
+    return fixed, sorted(dates)
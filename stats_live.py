@@ -0,0 +1,107 @@
+"""Tryb LIVE panelu: listenery on_snapshot na dzisiejsze statystyki.
+
+Listenery Firestore działają w wątku w tle i na bieżąco nakładają zmiany
+(stara wersja dokumentu odjęta, nowa dodana) na agregat w pamięci. Strona tylko
+odczytuje ten stan — kolejne odświeżenia nie wykonują żadnych zapytań.
+Jeden zestaw listenerów na proces (wspólny dla wszystkich sesji), przy zmianie
+dnia stare listenery są zamykane. Listenery bez podglądu (view) przez IDLE_SECONDS
+zamyka wątek sprzątający — nikt nie ogląda trybu LIVE, więc nie płacimy za zmiany.
+"""
+import threading
+import time
+
+from stats_agg import add_to_agg, new_stats_agg, summarize
+from stats_fetch import EW_COLLECTION, STATS_COLLECTION
+
+KEY_USAGE_COLLECTION = "key_usage"
+# Po tylu sekundach bez view() listenery dnia są zamykane (panel odświeża LIVE co kilka sekund)
+IDLE_SECONDS = 120
+
+_live_days = {}
+_live_lock = threading.Lock()
+_sweeper = None
+
+
+class LiveDay:
+    def __init__(self, db, day):
+        self.day = day
+        self.lock = threading.Lock()
+        self.docs = {}        # (kolekcja, operator) -> dane
+        self.agg = new_stats_agg()
+        self.key_usage = {}
+        self.last_change = None
+        self.last_view = time.monotonic()
+        self._watches = [
+            db.collection(coll).document(day).collection("operators").on_snapshot(self._on_operators(coll))
+            for coll in (STATS_COLLECTION, EW_COLLECTION)
+        ]
+        self._watches.append(db.collection(KEY_USAGE_COLLECTION).document(day).on_snapshot(self._on_key_usage))
+
+    def _on_operators(self, coll):
+        def callback(doc_snapshots, changes, read_time):
+            with self.lock:
+                for change in changes:
+                    doc = change.document
+                    old = self.docs.pop((coll, doc.id), None)
+                    if old is not None:
+                        add_to_agg(self.agg, coll, self.day, doc.id, old, sign=-1)
+                    if change.type.name != "REMOVED":
+                        data = doc.to_dict() or {}
+                        self.docs[(coll, doc.id)] = data
+                        add_to_agg(self.agg, coll, self.day, doc.id, data)
+                self.last_change = read_time
+        return callback
+
+    def _on_key_usage(self, doc_snapshots, changes, read_time):
+        with self.lock:
+            snap = doc_snapshots[0] if doc_snapshots else None
+            self.key_usage = (snap.to_dict() or {}) if snap is not None and snap.exists else {}
+            self.last_change = read_time
+
+    def view(self, selected_op="Wszyscy"):
+        """Stan do wyrenderowania: (podsumowanie, key_usage, czas ostatniej zmiany)."""
+        with self.lock:
+            self.last_view = time.monotonic()
+            frame = self.agg.frame()
+            key_usage = dict(self.key_usage)
+            last_change = self.last_change
+        return summarize(frame, selected_op), key_usage, last_change
+
+    def close(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+
+
+def _close_idle():
+    """Zamyka dni bez podglądu od IDLE_SECONDS (wywoływane pod _live_lock)."""
+    now = time.monotonic()
+    for day, live in list(_live_days.items()):
+        if now - live.last_view >= IDLE_SECONDS:
+            _live_days.pop(day).close()
+
+
+def _sweep():
+    global _sweeper
+    while True:
+        time.sleep(IDLE_SECONDS / 2)
+        with _live_lock:
+            _close_idle()
+            if not _live_days:
+                _sweeper = None
+                return
+
+
+def get_live_day(db, day):
+    """Zwraca listenery dla `day`, tworząc je przy pierwszym użyciu (i zamykając poprzedni dzień)."""
+    global _sweeper
+    with _live_lock:
+        _close_idle()
+        live = _live_days.get(day)
+        if live is None:
+            for old_day in list(_live_days):
+                _live_days.pop(old_day).close()
+            live = _live_days[day] = LiveDay(db, day)
+            if _sweeper is None:
+                _sweeper = threading.Thread(target=_sweep, name="live-day-sweeper", daemon=True)
+                _sweeper.start()
+        return live
@@ -0,0 +1,195 @@
+"""Rollupy statystyk: miesięczne podsumowania zamkniętych dni + podsumowanie All Time.
+
+Układ w Firestore:
+    stats_rollups/{YYYY-MM}  -> {"month", "days", "session_days", "operators": {op: payload}}
+    stats_rollups/all_time   -> {"watermark", "first_day", "days", "session_days", "operators": {op: payload}}
+
+payload operatora ma kształt dokumentu ze `stats` (plus EW), żeby panel mógł go
+agregować tym samym kodem co zwykłe dni:
+    {"sessions_completed", "pz_transitions": {...}, "session_hours": {"HH": n},
+     "diamonds", "cases_completed"}
+
+`watermark` to ostatni dzień zawarty w all_time — dni po nim panel czyta na żywo.
+`first_day` to pierwszy skompaktowany dzień — od niego liczone są dni kalendarzowe
+do średnich All Time (tak samo jak dla dni po watermarku).
+"""
+from datetime import datetime, timedelta
+
+from firebase_admin import firestore
+
+from stats_fetch import DAY_COLLECTIONS, EW_COLLECTION, STATS_COLLECTION, field_masks, iter_operator_days
+
+ROLLUP_COLLECTION = "stats_rollups"
+ALL_TIME_DOC = "all_time"
+
+
+def _empty_payload():
+    return {"sessions_completed": 0, "pz_transitions": {}, "session_hours": {},
+            "diamonds": 0, "cases_completed": 0}
+
+
+def _fold_stats_doc(payload, data):
+    payload["sessions_completed"] += data.get("sessions_completed", 0)
+    for t in data.get("session_times", []):
+        hour = t.split(":")[0]
+        payload["session_hours"][hour] = payload["session_hours"].get(hour, 0) + 1
+    for hour, n in data.get("session_hours", {}).items():
+        payload["session_hours"][hour] = payload["session_hours"].get(hour, 0) + n
+    t_map = data.get("pz_transitions", {})
+    if isinstance(t_map, dict):
+        for k, v in t_map.items():
+            payload["pz_transitions"][k] = payload["pz_transitions"].get(k, 0) + v
+            if k.endswith("_to_PZ6"):
+                payload["diamonds"] += v
+
+
+def _fold_payload(target, payload):
+    """Dodaje payload jednego rollupu do drugiego (miesiące -> all_time)."""
+    target["sessions_completed"] += payload.get("sessions_completed", 0)
+    for field in ("pz_transitions", "session_hours"):
+        for k, v in payload.get(field, {}).items():
+            target[field][k] = target[field].get(k, 0) + v
+    target["diamonds"] += payload.get("diamonds", 0)
+    target["cases_completed"] += payload.get("cases_completed", 0)
+
+
+def month_of(date_str):
+    return date_str[:7]
+
+
+def _compact_days(db, dates, operators):
+    """Dokłada dni `dates` do słownika operators {op: payload}. Zwraca daty z danymi w `stats`."""
+    session_days = set()
+    for coll, d_s, docs in iter_operator_days(db, dates, masks=field_masks()):
+        for name, data in docs:
+            payload = operators.setdefault(name, _empty_payload())
+            if coll == EW_COLLECTION:
+                payload["cases_completed"] += data.get("cases_completed", 0)
+            else:
+                _fold_stats_doc(payload, data)
+                session_days.add(d_s)
+    return session_days
+
+
+def load_all_time(db):
+    return db.collection(ROLLUP_COLLECTION).document(ALL_TIME_DOC).get().to_dict()
+
+
+def compact_closed_days(db, today_str):
+    """Kompaktuje dni zamknięte (< today_str) do rollupów miesięcznych i przelicza all_time.
+
+    Każdy dzień trafia do rollupu tylko raz (miesiąc pamięta listę `days`), więc
+    akcję można bezpiecznie powtarzać. Zwraca listę nowo skompaktowanych dni.
+    """
+    rollups = db.collection(ROLLUP_COLLECTION)
+    all_time = load_all_time(db) or {}
+    watermark = all_time.get("watermark", "")
+
+    closed = set()
+    for coll in DAY_COLLECTIONS:
+        for day_ref in db.collection(coll).list_documents():
+            if watermark < day_ref.id < today_str:
+                closed.add(day_ref.id)
+
+    by_month = {}
+    for d_s in sorted(closed):
+        by_month.setdefault(month_of(d_s), []).append(d_s)
+
+    for month, dates in by_month.items():
+        month_ref = rollups.document(month)
+        month_doc = month_ref.get().to_dict() or {}
+        done = set(month_doc.get("days", []))
+        new_dates = [d for d in dates if d not in done]
+        if not new_dates:
+            continue
+        operators = month_doc.get("operators", {})
+        session_days = _compact_days(db, new_dates, operators)
+        _write_month(month_ref, month, done | set(new_dates),
+                     month_doc.get("session_days", 0) + len(session_days), operators)
+
+    if closed or not all_time:
+        rebuild_all_time(db)
+    return sorted(closed)
+
+
+def _write_month(month_ref, month, days, session_days, operators):
+    month_ref.set({
+        "month": month,
+        "days": sorted(days),
+        "session_days": session_days,
+        "operators": operators,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    })
+
+
+def recompact_days(db, dates):
+    """Przelicza od zera rollupy miesięczne, które zawierają któryś z `dates` (np. po migracji
+    dokumentów), i składa all_time na nowo. Zwraca listę przeliczonych miesięcy."""
+    rollups = db.collection(ROLLUP_COLLECTION)
+    dates = set(dates)
+    redone = []
+    for month in sorted({month_of(d) for d in dates}):
+        month_ref = rollups.document(month)
+        month_doc = month_ref.get().to_dict() or {}
+        days = month_doc.get("days", [])
+        if not dates & set(days):
+            continue
+        operators = {}
+        session_days = _compact_days(db, days, operators)
+        _write_month(month_ref, month, days, len(session_days), operators)
+        redone.append(month)
+    if redone:
+        rebuild_all_time(db)
+    return redone
+
+
+def rebuild_all_time(db):
+    """Składa all_time z rollupów miesięcznych — O(liczba miesięcy) odczytów."""
+    rollups = db.collection(ROLLUP_COLLECTION)
+    operators = {}
+    days = 0
+    session_days = 0
+    watermark = ""
+    first_day = None
+    for doc in rollups.stream():
+        if doc.id == ALL_TIME_DOC:
+            continue
+        month_doc = doc.to_dict() or {}
+        for name, payload in month_doc.get("operators", {}).items():
+            _fold_payload(operators.setdefault(name, _empty_payload()), payload)
+        month_days = month_doc.get("days", [])
+        days += len(month_days)
+        session_days += month_doc.get("session_days", 0)
+        if month_days:
+            watermark = max(watermark, month_days[-1])
+            first_day = min(first_day or month_days[0], month_days[0])
+    rollups.document(ALL_TIME_DOC).set({
+        "watermark": watermark,
+        "first_day": first_day,
+        "days": days,
+        "session_days": session_days,
+        "operators": operators,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    })
+
+
+def rollup_totals(rollup):
+    """Sumy z rollupu All Time w formacie `base` dla headline_metrics."""
+    payloads = rollup.get("operators", {}).values()
+    return {"sessions": sum(p.get("sessions_completed", 0) for p in payloads),
+            "diamonds": sum(p.get("diamonds", 0) for p in payloads),
+            "ew": sum(p.get("cases_completed", 0) for p in payloads)}
+
+
+def iter_rollup_docs(rollup):
+    """Zwraca rollup w formacie iter_operator_days, żeby panel agregował go jak zwykłe dni."""
+    for name, payload in rollup.get("operators", {}).items():
+        yield STATS_COLLECTION, None, [(name, payload)]
+        yield EW_COLLECTION, None, [(name, {"cases_completed": payload.get("cases_completed", 0)})]
+
+
+def dates_after(watermark, today_str):
+    """Daty (YYYY-MM-DD) od dnia po watermarku do today_str włącznie."""
+    start = datetime.strptime(watermark, "%Y-%m-%d") + timedelta(days=1)
+    end = datetime.strptime(today_str, "%Y-%m-%d")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
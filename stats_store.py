@@ -0,0 +1,76 @@
+"""Wspólny (na cały proces) kolumnowy magazyn statystyk dla wszystkich sesji panelu.
+
+Trzymany jako singleton st.cache_resource: dni zamknięte są wczytywane raz na proces,
+dzisiejszy dzień odświeżany przyrostowo jednym trackerem dla wszystkich adminów
+(nie częściej niż co REFRESH_SECONDS). Każda sesja liczy swoje filtry i zakresy dat
+z magazynu, bez własnych odczytów z Firestore.
+
+Dane trzymane są w akumulatorze stats_agg (ramka w formacie długim), zmiana
+dokumentu = wiersze starej wersji ze znakiem minus + wiersze nowej.
+"""
+import threading
+import time
+
+from stats_agg import add_to_agg, new_stats_agg, summarize
+from stats_cache import iter_operator_days_cached
+from stats_delta import DayDeltaTracker
+from stats_fetch import STATS_COLLECTION
+
+REFRESH_SECONDS = 15
+
+
+class StatsStore:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.acc = new_stats_agg()
+        self.loaded = set()       # zamknięte dni już wczytane
+        self.all_dates = None     # lista dni z `stats` (All Time), pobierana raz na dzień
+        self.listed_on = None     # dzień, w którym pobrano all_dates
+        self.open_day = None
+        self.tracker = None
+        self.last_poll = 0.0
+
+    def _apply_changes(self, changes):
+        for coll, d_s, name, old_data, new_data in changes:
+            if old_data is not None:
+                add_to_agg(self.acc, coll, d_s, name, old_data, sign=-1)
+            if new_data is not None:
+                add_to_agg(self.acc, coll, d_s, name, new_data)
+
+    def known_dates(self, db, today_str):
+        with self.lock:
+            # Po zmianie dnia lista jest nieaktualna — dni powstałe od ostatniego pobrania by wypadły
+            if self.all_dates is None or self.listed_on != today_str:
+                self.all_dates = [ref.id for ref in db.collection(STATS_COLLECTION).list_documents()]
+                self.listed_on = today_str
+            return sorted(set(self.all_dates) | {today_str})
+
+    def sync(self, db, dates, today_str, force=False):
+        """Dociąga brakujące zamknięte dni i (co REFRESH_SECONDS) zmiany z dzisiaj."""
+        with self.lock:
+            if self.open_day and self.open_day != today_str:
+                # Zmiana dnia: domknij wczorajszy tracker i traktuj dzień jako zamknięty
+                self._apply_changes(self.tracker.poll(db))
+                self.loaded.add(self.open_day)
+                self.open_day = self.tracker = None
+
+            missing = [d for d in dates if d < today_str and d not in self.loaded]
+            for coll, d_s, docs in iter_operator_days_cached(db, missing, today_str):
+                for name, data in docs:
+                    add_to_agg(self.acc, coll, d_s, name, data)
+            self.loaded.update(missing)
+
+            if any(d >= today_str for d in dates):
+                if self.tracker is None:
+                    self.open_day = today_str
+                    self.tracker = DayDeltaTracker([today_str])
+                    self.last_poll = 0.0
+                if force or time.monotonic() - self.last_poll >= REFRESH_SECONDS:
+                    self._apply_changes(self.tracker.poll(db))
+                    self.last_poll = time.monotonic()
+
+    def aggregate(self, dates, selected_op="Wszyscy"):
+        """Podsumowanie (stats_agg.summarize) dla podanych dni i filtra operatora."""
+        with self.lock:
+            frame = self.acc.frame()
+        return summarize(frame, selected_op, dates)
@@ -0,0 +1,147 @@
+"""Zarządzanie Vertex AI Context Caching z panelu admina.
+
+Cache (CachedContent) żyje w konkretnym projekcie GCP i regionie, dla konkretnego
+modelu i treści promptu systemowego. Nazwa wyświetlana koduje model i hash treści
+z rejestru promptów (prompt_registry):
+    szturchacz|{model}|{sha256[:16]}
+więc panel widzi, który cache odpowiada któremu promptowi, a app_vertex (przy
+włączonym context_caching_enabled) znajduje go po tym samym kluczu (find_cache)
+zamiast wysyłać cały prompt systemowy przy każdym zapytaniu.
+
+vertexai.init() ustawia globalny projekt SDK, więc operacje na kolejnych
+projektach idą sekwencyjnie pod jednym lockiem. SDK importowany dopiero przy
+pierwszym użyciu — import vertexai trwa kilka sekund, a sekcja otwierana jest rzadko.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+CACHE_PREFIX = "szturchacz"
+# Modele do wyboru w app_vertex — dla nich panel rozgrzewa cache
+VERTEX_MODELS = ["gemini-2.5-pro", "gemini-2.5-flash"]
+DEFAULT_TTL = timedelta(minutes=60)
+# Cache z mniej niż tyle minut życia jest przedłużany przy rozgrzewaniu
+REFRESH_BEFORE = timedelta(minutes=15)
+# Minimalna liczba tokenów, dla której Vertex pozwala utworzyć cache
+MIN_CACHE_TOKENS = 4096
+
+_sdk_lock = threading.Lock()
+
+
+def cache_display_name(model, sha):
+    return f"{CACHE_PREFIX}|{model}|{sha[:16]}"
+
+
+def parse_display_name(display_name):
+    """(model, sha[:16]) albo None dla cache spoza panelu."""
+    parts = (display_name or "").split("|")
+    if len(parts) != 3 or parts[0] != CACHE_PREFIX:
+        return None
+    return parts[1], parts[2]
+
+
+def _caching(project, location, credentials):
+    import vertexai
+    from vertexai.preview import caching
+    vertexai.init(project=project, location=location, credentials=credentials)
+    return caching.CachedContent
+
+
+def _remaining(cached, now):
+    expire = cached.expire_time
+    return expire - now if expire else timedelta(0)
+
+
+def list_caches(projects, location, credentials):
+    """Żywe cache we wszystkich projektach: lista słowników (projekt, model, hash, wygasa, pozostało)."""
+    now = datetime.now(timezone.utc)
+    rows = []
+    with _sdk_lock:
+        for project in projects:
+            try:
+                caches = _caching(project, location, credentials).list()
+            except Exception as e:
+                rows.append({"project": project, "error": str(e)})
+                continue
+            for cached in caches:
+                key = parse_display_name(cached.display_name)
+                rows.append({
+                    "project": project,
+                    "model": key[0] if key else cached.model_name.rsplit("/", 1)[-1],
+                    "sha": key[1] if key else None,
+                    "display_name": cached.display_name,
+                    "resource_name": cached.resource_name,
+                    "expire_time": cached.expire_time,
+                    "remaining": _remaining(cached, now),
+                })
+    return rows
+
+
+def warm_caches(projects, models, prompts, location, credentials, ttl=DEFAULT_TTL):
+    """Tworzy brakujące i przedłuża kończące się cache dla każdego projektu x modelu x promptu.
+
+    `prompts` to {sha256: treść}. Zwraca listę (projekt, model, sha[:16], akcja albo błąd).
+    """
+    now = datetime.now(timezone.utc)
+    log = []
+    with _sdk_lock:
+        for project in projects:
+            try:
+                cached_content = _caching(project, location, credentials)
+                existing = {cached.display_name: cached for cached in cached_content.list()}
+            except Exception as e:
+                log.append((project, "-", "-", f"błąd: {e}"))
+                continue
+            for model in models:
+                for sha, text in prompts.items():
+                    name = cache_display_name(model, sha)
+                    cached = existing.get(name)
+                    try:
+                        if cached is None:
+                            cached_content.create(model_name=model, system_instruction=text, ttl=ttl,
+                                                  display_name=name)
+                            action = "utworzono"
+                        elif _remaining(cached, now) < REFRESH_BEFORE:
+                            cached.update(ttl=ttl)
+                            action = "przedłużono"
+                        else:
+                            action = "aktualny"
+                    except Exception as e:
+                        action = f"błąd: {e}"
+                    log.append((project, model, sha[:16], action))
+    return log
+
+
+def delete_stale(projects, location, credentials, keep):
+    """Usuwa cache panelu, których (model, sha[:16]) nie ma w `keep`.
+
+    Zwraca (usunięte nazwy, błędy) — błąd jednego projektu nie przerywa pozostałych.
+    """
+    deleted, errors = [], []
+    with _sdk_lock:
+        for project in projects:
+            try:
+                for cached in _caching(project, location, credentials).list():
+                    key = parse_display_name(cached.display_name)
+                    if key is not None and key not in keep:
+                        cached.delete()
+                        deleted.append(f"{project}: {cached.display_name}")
+            except Exception as e:
+                errors.append(f"{project}: {e}")
+    return deleted, errors
+
+
+def find_cache(model, sha):
+    """Żywy cache panelu dla (model, sha) w projekcie ustawionym już przez vertexai.init() albo None."""
+    from vertexai.preview import caching
+    name = cache_display_name(model, sha)
+    now = datetime.now(timezone.utc)
+    for cached in caching.CachedContent.list():
+        if cached.display_name == name and _remaining(cached, now) > timedelta(0):
+            return cached
+    return None
+
+
+def cached_model(cached):
+    """GenerativeModel z promptem systemowym z cache (zamiast system_instruction w każdym zapytaniu)."""
+    from vertexai.preview.generative_models import GenerativeModel
+    return GenerativeModel.from_cached_content(cached_content=cached)